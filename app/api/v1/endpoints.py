@@ -14,8 +14,9 @@ async def validate_document_endpoint(payload: DocumentRequest):
         raise HTTPException(status_code=400, detail="Imagem não fornecida")
 
     result = document_service.validate_document(
-        image_base64=payload.image_base64,
-        expected_type=payload.expected_type
+        file_content=payload.image_base64,
+        expected_type=payload.expected_type,
+        response_mode=payload.response_mode
     )
     
     # Mapeamento do retorno do serviço para o Schema de Resposta
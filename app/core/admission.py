@@ -0,0 +1,123 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from app.core.config import settings
+from app.core.constants import ADMISSION_COST_PER_MB
+from app.core.exceptions import OverloadedError
+
+
+class AdmissionController:
+    """
+    Controle de admissão por instância: limita o custo em processamento simultâneo
+    (um PDF de 15MB pesa mais que um JPEG pequeno) com uma fila curta e limitada (FIFO).
+    Excedentes são descartados rápido (OverloadedError -> HTTP 429 com Retry-After).
+    """
+
+    def __init__(self, max_inflight_cost: float, max_queue: int, max_wait_seconds: float):
+        self.max_inflight_cost = max_inflight_cost
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._inflight_cost = 0.0
+        self._inflight_requests = 0
+        # Média móvel (EWMA) do tempo de processamento, usada para prever espera e Retry-After
+        self._avg_service_seconds = None
+        self._metrics = {
+            "admitted_total": 0,
+            "shed_total": 0,
+            "shed_queue_full": 0,
+            "shed_timeout": 0,
+            "shed_predicted_wait": 0,
+        }
+
+    def estimate_cost(self, base64_length: int, file_name: str) -> float:
+        """Custo da requisição: 1 unidade base + MB decodificados ponderados pelo tipo de arquivo."""
+        extension = str(file_name).split('.')[-1].lower()
+        size_mb = (base64_length * 3 / 4) / (1024 * 1024)
+        cost = 1.0 + size_mb * ADMISSION_COST_PER_MB.get(extension, ADMISSION_COST_PER_MB["default"])
+        # Uma requisição nunca pode custar mais que a capacidade (senão jamais seria admitida)
+        return min(cost, self.max_inflight_cost)
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self._avg_service_seconds or 1))
+
+    def _shed(self, reason: str, message: str):
+        self._metrics["shed_total"] += 1
+        self._metrics[reason] += 1
+        raise OverloadedError(message, retry_after=self._retry_after())
+
+    def _acquire(self, cost: float):
+        with self._condition:
+            # Caminho rápido: sem fila e com capacidade livre
+            if not self._queue and self._inflight_cost + cost <= self.max_inflight_cost:
+                self._inflight_cost += cost
+                self._inflight_requests += 1
+                self._metrics["admitted_total"] += 1
+                return
+
+            if len(self._queue) >= self.max_queue:
+                self._shed("shed_queue_full", "Servidor sobrecarregado. Tente novamente em instantes.")
+
+            # Se a espera prevista já estoura o limite, descarta agora (sobrecarga deve ser barata)
+            slots = max(1, self._inflight_requests)
+            predicted_wait = (self._avg_service_seconds or 0.0) * (len(self._queue) + 1) / slots
+            if predicted_wait > self.max_wait_seconds * 2:
+                self._shed("shed_predicted_wait", "Servidor sobrecarregado. Tente novamente em instantes.")
+
+            ticket = object()
+            self._queue.append(ticket)
+            deadline = time.monotonic() + self.max_wait_seconds
+            try:
+                while self._queue[0] is not ticket or self._inflight_cost + cost > self.max_inflight_cost:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._shed("shed_timeout", "Tempo de espera na fila esgotado. Tente novamente em instantes.")
+                    self._condition.wait(remaining)
+                self._inflight_cost += cost
+                self._inflight_requests += 1
+                self._metrics["admitted_total"] += 1
+            finally:
+                self._queue.remove(ticket)
+                self._condition.notify_all()
+
+    def _release(self, cost: float, elapsed: float):
+        with self._condition:
+            self._inflight_cost = max(0.0, self._inflight_cost - cost)
+            self._inflight_requests -= 1
+            if self._avg_service_seconds is None:
+                self._avg_service_seconds = elapsed
+            else:
+                self._avg_service_seconds = 0.8 * self._avg_service_seconds + 0.2 * elapsed
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, cost: float):
+        """Bloqueia até haver capacidade (respeitando a fila) ou levanta OverloadedError."""
+        self._acquire(cost)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(cost, time.monotonic() - started)
+
+    def metrics(self) -> dict:
+        with self._condition:
+            return {
+                **self._metrics,
+                "inflight_requests": self._inflight_requests,
+                "inflight_cost": round(self._inflight_cost, 2),
+                "max_inflight_cost": self.max_inflight_cost,
+                "queue_depth": len(self._queue),
+                "avg_service_seconds": round(self._avg_service_seconds or 0.0, 2),
+            }
+
+
+admission_controller = AdmissionController(
+    max_inflight_cost=settings.ADMISSION_MAX_INFLIGHT_COST,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    max_wait_seconds=settings.ADMISSION_MAX_WAIT_SECONDS,
+)
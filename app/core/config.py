@@ -7,12 +7,74 @@ class Settings(BaseSettings):
     AZURE_OPENAI_ENDPOINT: str
     AZURE_OPENAI_DEPLOYMENT: str
     AZURE_OPENAI_API_VERSION: str = "2024-02-15-preview"
+    # Deployment menor/mais rápido usado na cascata (vazio = cascata desligada, tudo no deployment principal)
+    AZURE_OPENAI_FAST_DEPLOYMENT: str = ""
+    # Formato da resposta do LLM: "compact" (Structured Outputs, poucos tokens) ou "verbose" (auditoria/debug)
+    # Structured Outputs exige AZURE_OPENAI_API_VERSION >= 2024-08-01-preview; versões antigas caem para json_object
+    LLM_RESPONSE_MODE: str = "compact"
+    LLM_COMPACT_MAX_TOKENS: int = 120
+    LLM_VERBOSE_MAX_TOKENS: int = 300
+
+    # Modo multi-documento (PDF com vários documentos): limite de páginas e classificações em paralelo
+    SEGMENT_MAX_PAGES: int = 30
+    SEGMENT_MAX_WORKERS: int = 4
+
+    # Classificador local (n-gramas + modelo linear, treinado offline com os veredictos registrados)
+    # Vazio = desativado. Com confiança >= HINT a pré-classificação vai como indício no prompt;
+    # com SKIP_LLM ligado e confiança >= SKIP_CONFIDENCE no tipo esperado, o LLM nem é chamado.
+    LOCAL_CLASSIFIER_MODEL_PATH: str = ""
+    LOCAL_CLASSIFIER_HINT_CONFIDENCE: float = 0.85
+    LOCAL_CLASSIFIER_SKIP_LLM: bool = False
+    LOCAL_CLASSIFIER_SKIP_CONFIDENCE: float = 0.98
+    # JSONL com (texto extraído normalizado, detected_type) de cada veredicto do LLM; vazio = não registra
+    VERDICT_LOG_PATH: str = ""
+
+    # Limites por cliente (tenant): token bucket de requisições e de tokens de LLM por minuto
+    # TENANT_API_KEYS: {"chave": "tenant"}; TENANT_LIMITS: {"tenant": {"requests_per_minute": 30, "tokens_per_minute": 200000}}
+    # Sem chaves cadastradas os limites ficam desligados; com chaves, o front usa a própria (VALIDATOR_API_KEY)
+    TENANT_API_KEYS: dict = {}
+    TENANT_LIMITS: dict = {}
+    TENANT_DEFAULT_REQUESTS_PER_MINUTE: int = 120
+    TENANT_DEFAULT_TOKENS_PER_MINUTE: int = 400000
+    TENANT_MAX_WAIT_SECONDS: float = 2.0
+    # Máximo de clientes/subclientes com balde em memória por instância (os ociosos há mais tempo saem)
+    TENANT_MAX_TRACKED: int = 1000
 
     # --- NOVOS CAMPOS (Correção do Erro) ---
     # Configurações do Azure Computer Vision (OCR)
     AZURE_CV_KEY: str
     AZURE_CV_ENDPOINT: str
 
+    # Pré-checagem local de qualidade de imagem (evita OCR pago em fotos ilegíveis)
+    IMAGE_QUALITY_CHECK_ENABLED: bool = True
+    # Recorta a foto na área com texto (polígonos do OCR) antes de enviá-la ao LLM; opcionalmente endireita
+    OCR_CROP_ENABLED: bool = True
+    OCR_DESKEW_ENABLED: bool = True
+
+    # Índice de reenvios: reaproveita o veredicto de um documento reenviado pelo mesmo cliente
+    # (bytes idênticos, ou foto com pHash próximo E texto OCR confirmado). Desligado por padrão.
+    DUPLICATE_INDEX_ENABLED: bool = False
+    DUPLICATE_MAX_HAMMING_DISTANCE: int = 10
+
+    # Orçamento de memória por requisição (MB): acima disso o processamento é degradado ou rejeitado
+    REQUEST_MEMORY_BUDGET_MB: int = 128
+    # Loga o pico de memória de cada requisição via tracemalloc (tem overhead, usar só em diagnóstico)
+    MEMORY_TRACKING_ENABLED: bool = False
+
+    # Controle de admissão por instância (custo simultâneo, fila curta e descarte com HTTP 429)
+    ADMISSION_MAX_INFLIGHT_COST: float = 12.0
+    ADMISSION_MAX_QUEUE: int = 8
+    ADMISSION_MAX_WAIT_SECONDS: float = 5.0
+
+    # Single-flight: requisições idênticas compartilham uma validação; resultado fica em replay por N segundos
+    SINGLE_FLIGHT_REPLAY_SECONDS: float = 60.0
+
+    # Transporte de OCR/LLM: "live" (padrão), "record" (chama o Azure e grava) ou "replay" (offline, do disco)
+    TRANSPORT_MODE: str = "live"
+    CASSETTE_DIR: str = ".cassettes"
+    # Multiplica as latências gravadas no replay (0 = instantâneo, 1 = latência original)
+    REPLAY_LATENCY_SCALE: float = 1.0
+
     class Config:
         env_file = ".env"
         env_file_encoding = 'utf-8'
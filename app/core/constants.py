@@ -18,4 +18,89 @@ VALID_DOCUMENTS = [
     "CNH de Idoso",
     "Extrato do INSS",
     "Outros"
-]
\ No newline at end of file
+]
+
+# Limites da pré-checagem local de qualidade de imagem (antes do OCR pago)
+IMAGE_QUALITY_DEFAULTS = {
+    "min_side_px": 400,               # Menor lado mínimo da foto (pixels)
+    "min_blur_score": 40.0,           # Variância do Laplaciano (abaixo disso = borrada)
+    # Escuridão e superexposição = perda de contraste, não cor de fundo: papel branco/prints têm
+    # média alta e telas em modo escuro têm fundo quase preto, e ambos são perfeitamente legíveis
+    "min_paper_level": 80.0,          # Percentil 99,5 do brilho (o "branco" mais claro da foto) mínimo
+    "max_ink_level": 160.0,           # Percentil 0,5 do brilho (o "preto" mais escuro da foto) máximo
+    "min_contrast_spread": 60.0,      # Diferença mínima entre os percentis 99,5 e 0,5
+    "min_document_area_ratio": 0.05,  # Fração mínima da foto ocupada pelo documento
+}
+
+# Recorte da foto pela geometria do OCR (antes da chamada visual ao LLM)
+OCR_CROP_SETTINGS = {
+    "margin_ratio": 0.06,        # Margem em volta das linhas de texto (fração do lado da imagem); preserva foto/assinatura
+    "min_lines": 3,              # Abaixo disso a geometria não é confiável para recortar
+    "min_area_reduction": 0.15,  # Só recorta se remover pelo menos esta fração da área
+    "min_skew_degrees": 1.0,     # Inclinação abaixo disso não compensa rotacionar
+    "max_skew_degrees": 20.0,    # Acima disso provavelmente é leitura errada da geometria
+}
+
+# Ajustes por tipo de documento (sobrescrevem os padrões acima)
+IMAGE_QUALITY_THRESHOLDS = {
+    # Documentos pequenos com fundo texturizado/foto: tolera menos nitidez
+    "RG": {"min_blur_score": 30.0},
+    "RG de Idoso": {"min_blur_score": 30.0},
+    "CNH de Idoso": {"min_blur_score": 30.0},
+    "CPF": {"min_side_px": 300, "min_blur_score": 30.0},
+    # Documentos densos em texto pequeno exigem mais resolução
+    "Extrato Bancário": {"min_side_px": 600},
+    "Holerite": {"min_side_px": 600},
+    "Declaração de Imposto de Renda": {"min_side_px": 600},
+    "Extrato do INSS": {"min_side_px": 600},
+}
+
+# Custo estimado de memória por tipo de arquivo (múltiplos do tamanho decodificado)
+# pdf: leitor pypdf + imagens embutidas decodificadas; image: bytes + cópia reduzida para o LLM
+MEMORY_COST_FACTORS = {
+    "pdf": 4.0,
+    "jpg": 2.0,
+    "png": 3.0,
+    "docx": 1.5,
+    "doc": 1.0,
+    "default": 3.0,
+}
+
+# Peso de admissão por MB decodificado (PDFs disparam OCR por imagem e custam mais)
+ADMISSION_COST_PER_MB = {
+    "pdf": 1.0,
+    "jpg": 0.25,
+    "png": 0.25,
+    "docx": 0.1,
+    "doc": 0.1,
+    "default": 0.5,
+}
+
+# Cascata de modelos por tipo de documento: "cascade" tenta o deployment rápido primeiro,
+# "strong" vai direto ao GPT-4o (tipos onde o modelo menor erra com frequência)
+MODEL_ROUTING = {
+    "default": "cascade",
+    "CPF": "strong",
+    "Carteira de Trabalho (Último Registro)": "strong",
+    "Carteira de Trabalho (Folha de Rosto)": "strong",
+    "Extrato Poupança ou Aplicação": "strong",
+    "Extrato do Seguro-Desemprego": "strong",
+}
+
+# Rótulos que o modelo pode devolver além da lista oficial (regras do prompt)
+EXTRA_DETECTED_TYPES = [
+    "Comprovante de Residência",
+    "CNH",
+    "Aviso de Inexistência"
+]
+
+# Estimativa de tokens de LLM antes da chamada (limites por cliente; conciliada com response.usage)
+TOKEN_ESTIMATES = {
+    "system_prompt": 2600,          # Prompt de regras de negócio
+    "completion": 300,              # Teto de saída (modo verboso)
+    "image": 1105,                  # 6 tiles de 512px em detail=high (imagem reduzida a 2048x768) + base
+    "max_text": 6250,               # MAX_TEXT_LENGTH (25000 caracteres) / ~4 caracteres por token
+    "min_text": 500,
+    "bytes_per_text_token": 40,     # PDFs/DOCX carregam muito mais bytes que texto
+    "multi_document_factor": 2,
+}
@@ -7,4 +7,23 @@ class DocumentValidationError(Exception):
 
 class LLMProcessingError(Exception):
     """Exceção levantada quando falha a comunicação com a OpenAI."""
-    pass
\ No newline at end of file
+    pass
+
+class OverloadedError(Exception):
+    """Exceção levantada quando a instância está saturada e a requisição é descartada (HTTP 429)."""
+    def __init__(self, message: str, retry_after: int = 1):
+        self.message = message
+        self.retry_after = retry_after
+        super().__init__(self.message)
+
+class TenantRateLimitError(OverloadedError):
+    """Exceção levantada quando um cliente (tenant) excede seu limite de requisições ou tokens (HTTP 429)."""
+    pass
+
+class IdempotencyConflictError(Exception):
+    """Exceção levantada quando uma Idempotency-Key é reutilizada com conteúdo diferente (HTTP 422)."""
+    pass
+
+class CassetteMissError(Exception):
+    """Exceção levantada no modo replay quando não há resposta gravada para a requisição."""
+    pass
@@ -0,0 +1,85 @@
+import io
+import math
+import tracemalloc
+from contextlib import contextmanager
+from PIL import Image
+
+
+@contextmanager
+def track_peak_memory():
+    """
+    Mede o pico de memória alocada (tracemalloc) durante o bloco.
+    Uso: with track_peak_memory() as usage: ... ; usage["peak_mb"]
+    Com requisições concorrentes o pico é do processo inteiro (aproximação).
+    Só enxerga alocações do Python: buffers em C (pixels do Pillow, NumPy fora do alocador) ficam de fora.
+    """
+    usage = {"peak_bytes": 0, "peak_mb": 0.0}
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    try:
+        yield usage
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        usage["peak_bytes"] = max(0, peak - baseline)
+        usage["peak_mb"] = round(usage["peak_bytes"] / (1024 * 1024), 2)
+        if started_here:
+            tracemalloc.stop()
+
+
+def base64_length(payload) -> int:
+    """
+    Tamanho em Base64 do arquivo, venha ele codificado (JSON) ou cru (upload binário).
+    As estimativas de memória, tokens e custo partem dele; para bytes crus fica levemente conservador.
+    """
+    if isinstance(payload, str):
+        return len(payload)
+    return (len(payload) + 2) // 3 * 4
+
+
+def estimate_request_memory(base64_length: int, extension: str, cost_factors: dict) -> int:
+    """
+    Estimativa do pico de memória de uma requisição, em bytes, a partir do tamanho do Base64
+    (a string em si + bytes decodificados multiplicados pelo custo do tipo de arquivo).
+    """
+    decoded_size = base64_length * 3 // 4
+    factor = cost_factors.get(extension, cost_factors["default"])
+    return int(base64_length + decoded_size * factor)
+
+
+def image_decode_memory(image_bytes: bytes, max_side: int) -> int:
+    """
+    Memória da imagem decodificada por open_reduced(img, max_side) (largura x altura x bytes por pixel),
+    lida só do cabeçalho, sem decodificar. JPEG é decodificado já reduzido (draft em 1/2, 1/4 ou 1/8):
+    pesa a escala que o decoder vai usar. Demais formatos (PNG) precisam da imagem inteira antes do
+    reduce(): um PNG de 250 KB com 10000x8000 ocupa ~320 MB no Pillow.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        width, height = img.size
+        factor = math.ceil(max(width, height) / max_side)
+        if img.format == "JPEG" and factor > 1:
+            # draft() só ajusta o decoder e o tamanho; nada é decodificado aqui
+            img.draft(img.mode, (width // factor, height // factor))
+            width, height = img.size
+        # O Pillow guarda modos multibanda (RGB inclusive) com 4 bytes por pixel; paleta vira RGB(A) ao converter
+        bytes_per_pixel = 1 if img.mode in ("L", "1") else 4
+    return width * height * bytes_per_pixel
+
+
+def open_reduced(img: Image.Image, max_side: int) -> Image.Image:
+    """
+    Decodifica já reduzida para caber em max_side, antes de qualquer convert()/rotate():
+    JPEG reduz no próprio decoder (draft); demais formatos usam reduce() (média de blocos),
+    evitando cópias convertidas em resolução cheia.
+    """
+    width, height = img.size
+    factor = math.ceil(max(width, height) / max_side)
+    if factor <= 1:
+        return img
+    img.draft(img.mode, (width // factor, height // factor))
+    if img.mode in ("P", "1", "PA"):
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode == "PA" else "RGB")
+    factor = math.ceil(max(img.size) / max_side)
+    return img.reduce(factor) if factor > 1 else img
@@ -0,0 +1,182 @@
+import math
+import time
+import threading
+from collections import OrderedDict
+from app.core.config import settings
+from app.core.constants import TOKEN_ESTIMATES
+from app.core.exceptions import TenantRateLimitError
+
+
+class TokenBucket:
+    """
+    Token bucket clássico (capacidade = limite por minuto, reposição contínua).
+    Aceita saldo negativo: o consumo real acima da estimativa vira dívida e atrasa as próximas requisições.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos até haver saldo para `amount` (0 se já há)."""
+        self._refill(time.monotonic())
+        # Pedidos maiores que a capacidade só exigem o balde cheio
+        needed = min(amount, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill(time.monotonic())
+        self.tokens -= amount
+
+    def refund(self, amount: float):
+        self._refill(time.monotonic())
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class TenantLimiter:
+    """
+    Limites por cliente (tenant): requisições/min e tokens de LLM/min, com ledger em memória por instância.
+    Tokens são reservados pela estimativa antes da chamada e conciliados com response.usage depois.
+    Cliente acima do limite espera até TENANT_MAX_WAIT_SECONDS; além disso recebe 429.
+    Subclientes ("cliente/sub") consomem o próprio balde E o do cliente: trocar de sub não contorna o limite.
+    No máximo max_tenants baldes em memória; os usados há mais tempo são descartados (já estão cheios de novo).
+    Desligado (enabled=False) quando não há chaves cadastradas: sem chave não dá para separar os clientes,
+    e um balde único faria o front interativo dividir o limite com qualquer chamador em lote.
+    """
+
+    def __init__(self, max_wait_seconds: float, max_tenants: int = 1000, enabled: bool = True):
+        self.max_wait_seconds = max_wait_seconds
+        self.max_tenants = max_tenants
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._ledger = {}
+
+    def _limits_for(self, tenant: str) -> dict:
+        limits = {
+            "requests_per_minute": settings.TENANT_DEFAULT_REQUESTS_PER_MINUTE,
+            "tokens_per_minute": settings.TENANT_DEFAULT_TOKENS_PER_MINUTE,
+        }
+        limits.update(settings.TENANT_LIMITS.get(tenant, {}))
+        return limits
+
+    def _state(self, tenant: str) -> tuple[dict, dict]:
+        if tenant in self._buckets:
+            self._buckets.move_to_end(tenant)
+        else:
+            while len(self._buckets) >= self.max_tenants:
+                evicted, _ = self._buckets.popitem(last=False)
+                self._ledger.pop(evicted, None)
+            limits = self._limits_for(tenant)
+            self._buckets[tenant] = {
+                "requests": TokenBucket(limits["requests_per_minute"]),
+                "tokens": TokenBucket(limits["tokens_per_minute"]),
+            }
+            self._ledger[tenant] = {
+                "requests": 0, "rejected": 0, "estimated_tokens": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+            }
+        return self._buckets[tenant], self._ledger[tenant]
+
+    def _acquire(self, tenant: str, bucket_name: str, amount: float, message: str, deadline: float):
+        while True:
+            with self._lock:
+                buckets, ledger = self._state(tenant)
+                bucket = buckets[bucket_name]
+                wait = bucket.wait_time(amount)
+                if wait == 0:
+                    bucket.consume(amount)
+                    return
+                # Prazo total, não por tentativa: sob disputa outra requisição pode levar o saldo a cada volta
+                if time.monotonic() + wait > deadline:
+                    ledger["rejected"] += 1
+                    raise TenantRateLimitError(message, retry_after=max(1, math.ceil(wait)))
+            # Espera curta fora do lock (enfileira em vez de rejeitar quando falta pouco)
+            time.sleep(wait)
+
+    @staticmethod
+    def _chain(tenant: str) -> list[str]:
+        """'cliente/sub' -> ['cliente', 'cliente/sub']."""
+        parent, _, sub = tenant.partition("/")
+        return [parent, tenant] if sub else [tenant]
+
+    def _acquire_chain(self, tenant: str, bucket_name: str, amount: float, message: str, counter: str):
+        acquired = []
+        deadline = time.monotonic() + self.max_wait_seconds
+        try:
+            for level in self._chain(tenant):
+                self._acquire(level, bucket_name, amount, message, deadline)
+                acquired.append(level)
+        except TenantRateLimitError:
+            # Devolve o que já foi consumido nos níveis acima
+            with self._lock:
+                for level in acquired:
+                    self._state(level)[0][bucket_name].refund(amount)
+            raise
+        with self._lock:
+            for level in acquired:
+                self._state(level)[1][counter] += amount
+
+    def acquire_request(self, tenant: str):
+        if not self.enabled:
+            return
+        self._acquire_chain(tenant, "requests", 1, "Limite de requisições por minuto excedido para este cliente.", "requests")
+
+    def reserve_tokens(self, tenant: str, estimated_tokens: int):
+        if not self.enabled:
+            return
+        self._acquire_chain(tenant, "tokens", estimated_tokens, "Limite de tokens por minuto excedido para este cliente.", "estimated_tokens")
+
+    def reconcile(self, tenant: str, estimated_tokens: int, usage: dict):
+        """Ajusta o balde com o consumo real (usage do LLM); sobra é devolvida, excesso vira dívida."""
+        if not self.enabled:
+            return
+        actual = usage.get("total_tokens", 0) if usage else 0
+        with self._lock:
+            for level in self._chain(tenant):
+                buckets, ledger = self._state(level)
+                if actual > estimated_tokens:
+                    buckets["tokens"].consume(actual - estimated_tokens)
+                else:
+                    buckets["tokens"].refund(estimated_tokens - actual)
+                for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                    ledger[key] += (usage or {}).get(key, 0)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                tenant: {
+                    **ledger,
+                    "tokens_available": round(self._buckets[tenant]["tokens"].tokens),
+                    "requests_available": round(self._buckets[tenant]["requests"].tokens, 1),
+                }
+                for tenant, ledger in self._ledger.items()
+            }
+
+
+def estimate_request_tokens(base64_length: int, file_name: str, multi_document: bool = False) -> int:
+    """Estimativa conservadora de tokens de LLM antes da chamada (conciliada depois com usage)."""
+    extension = str(file_name).split('.')[-1].lower()
+    prompt = TOKEN_ESTIMATES["system_prompt"] + TOKEN_ESTIMATES["completion"]
+    if extension in ("jpg", "jpeg", "png"):
+        return prompt + TOKEN_ESTIMATES["image"]
+
+    # Texto extraído: limitado por MAX_TEXT_LENGTH; arquivos pequenos raramente chegam ao teto
+    text_tokens = min(TOKEN_ESTIMATES["max_text"], base64_length * 3 // 4 // TOKEN_ESTIMATES["bytes_per_text_token"])
+    estimate = prompt + max(text_tokens, TOKEN_ESTIMATES["min_text"])
+    return estimate * TOKEN_ESTIMATES["multi_document_factor"] if multi_document else estimate
+
+
+tenant_limiter = TenantLimiter(
+    max_wait_seconds=settings.TENANT_MAX_WAIT_SECONDS,
+    max_tenants=settings.TENANT_MAX_TRACKED,
+    enabled=bool(settings.TENANT_API_KEYS),
+)
@@ -0,0 +1,119 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from app.core.config import settings
+from app.core.exceptions import IdempotencyConflictError
+
+
+class _Flight:
+    """Uma computação em andamento (ou concluída) compartilhada entre requisições idênticas."""
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+
+class RequestCoalescer:
+    """
+    Single-flight por instância: requisições idênticas (mesmo conteúdo + tipo, ou mesma
+    Idempotency-Key) aguardam uma única validação e recebem o mesmo resultado.
+    Resultados concluídos ficam disponíveis por uma janela curta de replay.
+    """
+    HASH_CHUNK_CHARS = 1024 * 1024  # Evita copiar o Base64 inteiro de uma vez ao calcular o hash
+
+    def __init__(self, replay_seconds: float, max_entries: int = 1000, wait_timeout_seconds: float = 120.0):
+        self.replay_seconds = replay_seconds
+        self.max_entries = max_entries
+        self.wait_timeout_seconds = wait_timeout_seconds
+        self._flights: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {"leaders_total": 0, "coalesced_total": 0, "replayed_total": 0}
+
+    def fingerprint(self, file_content, expected_type: str, extension: str = "") -> str:
+        """
+        Hash do conteúdo (Base64 do JSON ou bytes do upload binário) + tipo esperado + extensão
+        (a extensão decide o caminho de extração: o mesmo conteúdo como .pdf e .jpg não é a mesma validação).
+        """
+        is_binary = not isinstance(file_content, str)
+        header = f"{expected_type}\x00{str(extension).lower()}"
+        digest = hashlib.sha256(header.encode("utf-8") + (b"\x00bin\x00" if is_binary else b"\x00"))
+        for start in range(0, len(file_content), self.HASH_CHUNK_CHARS):
+            chunk = file_content[start:start + self.HASH_CHUNK_CHARS]
+            digest.update(chunk if is_binary else chunk.encode("ascii", "ignore"))
+        return digest.hexdigest()
+
+    def build_key(self, fingerprint: str, idempotency_key: str = None, tenant: str = "anonimo") -> str:
+        # Voos nunca são compartilhados entre clientes: o resultado (e o 429 do líder) pertence ao tenant que o gerou
+        if idempotency_key:
+            return f"idem:{tenant}:{idempotency_key.strip()}"
+        return f"content:{tenant}:{fingerprint}"
+
+    def _evict_expired(self, now: float):
+        for key in list(self._flights):
+            flight = self._flights[key]
+            if flight.done.is_set() and now - flight.finished_at > self.replay_seconds:
+                del self._flights[key]
+        while len(self._flights) > self.max_entries:
+            oldest_key, oldest = next(iter(self._flights.items()))
+            if not oldest.done.is_set():
+                break
+            del self._flights[oldest_key]
+
+    def run(self, key: str, fingerprint: str, compute, cacheable=None) -> tuple[dict, bool]:
+        """
+        Executa compute() uma única vez por chave. Retorna (resultado, compartilhado),
+        onde compartilhado indica que o resultado veio de outra requisição (em andamento ou replay).
+        cacheable(resultado) decide se o resultado fica na janela de replay (padrão: sempre).
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._evict_expired(now)
+            flight = self._flights.get(key)
+            if flight is not None and flight.fingerprint != fingerprint:
+                raise IdempotencyConflictError("Idempotency-Key já utilizada com outro conteúdo.")
+
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight(fingerprint)
+                self._flights[key] = flight
+                self._metrics["leaders_total"] += 1
+            elif flight.done.is_set():
+                self._metrics["replayed_total"] += 1
+            else:
+                self._metrics["coalesced_total"] += 1
+
+        if not is_leader:
+            if not flight.done.wait(self.wait_timeout_seconds):
+                # O líder travou: segue sozinho em vez de esperar para sempre
+                return compute(), False
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = compute()
+            if cacheable is not None and not cacheable(flight.result):
+                with self._lock:
+                    self._flights.pop(key, None)
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                # Falhas não entram na janela de replay; a próxima tentativa recomputa
+                self._flights.pop(key, None)
+            raise
+        finally:
+            flight.finished_at = time.monotonic()
+            flight.done.set()
+        return flight.result, False
+
+    def metrics(self) -> dict:
+        with self._lock:
+            inflight = sum(1 for flight in self._flights.values() if not flight.done.is_set())
+            return {**self._metrics, "inflight_keys": inflight, "cached_keys": len(self._flights) - inflight}
+
+
+request_coalescer = RequestCoalescer(replay_seconds=settings.SINGLE_FLIGHT_REPLAY_SECONDS)
@@ -1,10 +1,13 @@
 import streamlit as st
 import requests
 import base64
+import os
 import uuid
 
 # --- Configurações ---
 API_URL = "http://localhost:7071/api/validate_document"
+# Chave do front em TENANT_API_KEYS: usuários interativos não dividem o limite com chamadores sem chave
+API_KEY = os.environ.get("VALIDATOR_API_KEY")
 
 DOC_TYPES = [
     "Extrato Bancário", "Holerite", "Carteira de Trabalho (Último Registro)",
@@ -98,7 +101,7 @@ def main():
                     }
 
                     try:
-                        response = requests.post(API_URL, json=payload, timeout=90) # Aumentei timeout para PDFs grandes
+                        response = requests.post(API_URL, json=payload, headers={"x-api-key": API_KEY} if API_KEY else None, timeout=90) # Aumentei timeout para PDFs grandes
                         response.raise_for_status()
                         result = response.json()
 
@@ -113,7 +116,13 @@ def main():
                                 c2.metric("Tipo", result.get("detected_type"))
                                 c3.metric("Método", result.get("method_used", "IA"))
                                 
-                                st.info(f"💡 **Detalhes:** {result.get('details', {}).get('reasoning', 'Sem detalhes adicionais.')}")
+                                # Modo compacto devolve reasoning null na aprovação confiante: mostra as palavras-chave
+                                details = result.get("details") or {}
+                                keywords = details.get("keywords") or details.get("step_1_keywords")
+                                if isinstance(keywords, list):
+                                    keywords = ", ".join(str(k) for k in keywords)
+                                detail_text = details.get("reasoning") or (f"Palavras-chave encontradas: {keywords}" if keywords else "Sem detalhes adicionais.")
+                                st.info(f"💡 **Detalhes:** {detail_text}")
                                 st.balloons()
                             else:
                                 st.error(f"❌ Documento REJEITADO")
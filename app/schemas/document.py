@@ -4,6 +4,7 @@ from typing import Optional, Literal
 class DocumentRequest(BaseModel):
     expected_type: str = Field(..., description="Tipo esperado (ex: RG)")
     image_base64: str = Field(..., description="Base64 da imagem")
+    response_mode: Optional[Literal["compact", "verbose"]] = Field(None, description="'verbose' para auditoria/debug")
 
 class DocumentResponse(BaseModel):
     status: Literal["success", "error"]
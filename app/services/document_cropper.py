@@ -0,0 +1,134 @@
+import io
+import math
+import numpy as np
+from PIL import Image
+from app.core.constants import OCR_CROP_SETTINGS
+from app.core.memory import open_reduced
+
+
+class DocumentCropper:
+    """
+    Recorta a foto na região do documento usando os polígonos das linhas do OCR (Azure Vision READ)
+    e, opcionalmente, corrige a inclinação. O LLM recebe menos fundo: menos tiles, tokens e latência.
+    """
+    # Orientação EXIF: se a foto depende dela, as coordenadas do OCR podem não bater com os pixels
+    EXIF_ORIENTATION_TAG = 0x0112
+    # Resolução de trabalho: o LLM reduz para 2048 de qualquer forma; folga para o recorte manter detalhe
+    WORK_MAX_SIDE = 4096
+
+    @staticmethod
+    def _polygons(lines: list) -> list[np.ndarray]:
+        return [np.asarray(line["polygon"], dtype=np.float64) for line in lines or [] if len(line.get("polygon") or []) >= 4]
+
+    @staticmethod
+    def estimate_skew(polygons: list[np.ndarray]) -> float:
+        """Inclinação (graus, horário positivo) pela mediana das bordas superior/inferior das linhas."""
+        angles = []
+        for poly in polygons:
+            # Polígono do READ: superior-esquerdo, superior-direito, inferior-direito, inferior-esquerdo
+            for start, end in ((poly[0], poly[1]), (poly[3], poly[2])):
+                dx, dy = end[0] - start[0], end[1] - start[1]
+                if dx > 0:
+                    angles.append(math.degrees(math.atan2(dy, dx)))
+        return float(np.median(angles)) if angles else 0.0
+
+    @staticmethod
+    def estimate_vision_tiles(width: int, height: int) -> int:
+        """Tiles de 512px cobrados pelo GPT-4o em detail=high (após caber em 2048 e menor lado em 768)."""
+        scale = min(1.0, 2048 / max(width, height))
+        width, height = width * scale, height * scale
+        scale = min(1.0, 768 / min(width, height))
+        width, height = width * scale, height * scale
+        return math.ceil(width / 512) * math.ceil(height / 512)
+
+    @staticmethod
+    def _rotate_points(points: np.ndarray, angle: float, old_size: tuple, new_size: tuple) -> np.ndarray:
+        """Mesma transformação de Image.rotate(angle, expand=True) aplicada às coordenadas."""
+        theta = math.radians(angle)
+        cos, sin = math.cos(theta), math.sin(theta)
+        dx = points[:, 0] - old_size[0] / 2
+        dy = points[:, 1] - old_size[1] / 2
+        return np.column_stack((
+            new_size[0] / 2 + dx * cos + dy * sin,
+            new_size[1] / 2 - dx * sin + dy * cos,
+        ))
+
+    def layout_hints(self, lines: list, image_size: tuple) -> dict:
+        """Resumo da geometria do OCR (área de texto normalizada, inclinação, nº de linhas)."""
+        polygons = self._polygons(lines)
+        if not polygons:
+            return {"line_count": len(lines or []), "text_bbox": None, "skew_degrees": 0.0, "text_area_ratio": 0.0}
+
+        width, height = image_size
+        points = np.vstack(polygons)
+        x0, y0 = (float(v) for v in points.min(axis=0))
+        x1, y1 = (float(v) for v in points.max(axis=0))
+        bbox = [
+            round(max(0.0, x0 / width), 3), round(max(0.0, y0 / height), 3),
+            round(min(1.0, x1 / width), 3), round(min(1.0, y1 / height), 3),
+        ]
+        return {
+            "line_count": len(lines),
+            "text_bbox": bbox,
+            "skew_degrees": round(self.estimate_skew(polygons), 2),
+            "text_area_ratio": round((bbox[2] - bbox[0]) * (bbox[3] - bbox[1]), 3),
+        }
+
+    def crop(self, image_bytes: bytes, lines: list, deskew: bool = True) -> tuple[bytes, dict]:
+        """
+        Retorna (JPEG recortado, info). Devolve (None, info) quando não vale a pena recortar
+        ou a geometria não é confiável; nesse caso a imagem original segue para o LLM.
+        """
+        cfg = OCR_CROP_SETTINGS
+        polygons = self._polygons(lines)
+        if len(polygons) < cfg["min_lines"]:
+            return None, {"applied": False, "reason": "geometria_insuficiente"}
+
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                if img.getexif().get(self.EXIF_ORIENTATION_TAG, 1) != 1:
+                    return None, {"applied": False, "reason": "orientacao_exif"}
+
+                original_size = img.size
+                work = open_reduced(img, self.WORK_MAX_SIDE)
+                # Polígonos do OCR estão na resolução original
+                points = np.vstack(polygons) * (work.size[0] / original_size[0], work.size[1] / original_size[1])
+                work_size = work.size
+
+                skew = self.estimate_skew(polygons) if deskew else 0.0
+                if not cfg["min_skew_degrees"] <= abs(skew) <= cfg["max_skew_degrees"]:
+                    skew = 0.0
+                if skew:
+                    work = work.convert("RGB").rotate(skew, resample=Image.BICUBIC, expand=True, fillcolor="white")
+                    points = self._rotate_points(points, skew, work_size, work.size)
+
+                width, height = work.size
+                margin_x = cfg["margin_ratio"] * width
+                margin_y = cfg["margin_ratio"] * height
+                box = (
+                    max(0, int(points[:, 0].min() - margin_x)),
+                    max(0, int(points[:, 1].min() - margin_y)),
+                    min(width, int(math.ceil(points[:, 0].max() + margin_x))),
+                    min(height, int(math.ceil(points[:, 1].max() + margin_y))),
+                )
+                cropped_area = (box[2] - box[0]) * (box[3] - box[1])
+                reduction = 1 - cropped_area / (work_size[0] * work_size[1])
+                if reduction < cfg["min_area_reduction"] and not skew:
+                    return None, {"applied": False, "reason": "documento_ja_enquadrado", "area_reduction": round(reduction, 3)}
+
+                cropped = work.crop(box).convert("RGB")
+                buffer = io.BytesIO()
+                cropped.save(buffer, format="JPEG", quality=90)
+        except Exception as e:
+            print(f"Aviso recorte OCR: {e}")
+            return None, {"applied": False, "reason": "falha_recorte"}
+
+        return buffer.getvalue(), {
+            "applied": True,
+            "original_size": list(original_size),
+            "cropped_size": [box[2] - box[0], box[3] - box[1]],
+            "area_reduction": round(reduction, 3),
+            "skew_corrected_degrees": round(skew, 2),
+            "vision_tiles_before": self.estimate_vision_tiles(*original_size),
+            "vision_tiles_after": self.estimate_vision_tiles(box[2] - box[0], box[3] - box[1]),
+        }
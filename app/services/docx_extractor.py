@@ -0,0 +1,105 @@
+import io
+import re
+import zlib
+import zipfile
+import xml.etree.ElementTree as ET
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class DocxStreamExtractor:
+    """
+    Extrai texto de .docx lendo o XML direto do zip (iterparse), sem montar o DOM do python-docx.
+    Cobre parágrafos, tabelas (holerites em Word), cabeçalhos e rodapés, com memória limitada
+    e parada antecipada quando o orçamento de texto é atingido.
+    """
+    OLE_MAGIC = b'\xd0\xcf\x11\xe0'
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+
+    def _part_names(self, archive: zipfile.ZipFile) -> list[str]:
+        """Cabeçalhos primeiro (costumam ter o título do documento), depois corpo e rodapés."""
+        names = archive.namelist()
+        headers = sorted(n for n in names if re.fullmatch(r"word/header\d*\.xml", n))
+        footers = sorted(n for n in names if re.fullmatch(r"word/footer\d*\.xml", n))
+        return headers + ["word/document.xml"] + footers
+
+    def _iter_part(self, stream):
+        """Gera blocos de texto (linhas) de uma parte XML, liberando cada nó após o uso."""
+        paragraph = []
+        # Uma entrada (linha, célula) por nível de tabela: tabelas aninhadas não misturam as células da externa
+        tables = []
+
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag == W_NS + "tbl":
+                    tables.append(([], []))
+                continue
+
+            if tag == W_NS + "t":
+                paragraph.append(elem.text or "")
+            elif tag == W_NS + "tab":
+                paragraph.append("\t")
+            elif tag in (W_NS + "br", W_NS + "cr"):
+                paragraph.append("\n")
+            elif tag == W_NS + "p":
+                text = "".join(paragraph).strip()
+                paragraph = []
+                if tables:
+                    if text:
+                        tables[-1][1].append(text)
+                elif text:
+                    yield text
+                elem.clear()
+            elif tag == W_NS + "tc" and tables:
+                row, cell = tables[-1]
+                row.append(" ".join(cell))
+                cell.clear()
+                elem.clear()
+            elif tag == W_NS + "tr" and tables:
+                row = tables[-1][0]
+                line = " | ".join(c for c in row if c)
+                row.clear()
+                if line:
+                    if len(tables) > 1:
+                        # Linha de tabela aninhada vira conteúdo da célula que a contém
+                        tables[-2][1].append(line)
+                    else:
+                        yield line
+                elem.clear()
+            elif tag == W_NS + "tbl" and tables:
+                tables.pop()
+                elem.clear()
+
+    def extract(self, file_bytes: bytes) -> tuple[str, str]:
+        """Retorna (texto, flag_de_erro) no mesmo formato da extração de PDF."""
+        if file_bytes.startswith(self.OLE_MAGIC):
+            return "", "DOC_LEGACY_FORMAT"
+
+        lines = []
+        total = 0
+        try:
+            with zipfile.ZipFile(io.BytesIO(file_bytes)) as archive:
+                available = set(archive.namelist())
+                if "word/document.xml" not in available:
+                    return "", "DOCX_CORRUPTED"
+
+                for part in self._part_names(archive):
+                    if part not in available:
+                        continue
+                    with archive.open(part) as stream:
+                        for line in self._iter_part(stream):
+                            lines.append(line)
+                            total += len(line) + 1
+                            if total >= self.max_chars:
+                                # Orçamento atingido: não precisa ler o resto do arquivo
+                                return "\n".join(lines), None
+        # NotImplementedError: compressão não suportada; RuntimeError: entrada criptografada;
+        # zlib.error/EOFError: fluxo deflate truncado ou corrompido
+        except (zipfile.BadZipFile, ET.ParseError, KeyError, NotImplementedError, RuntimeError, zlib.error, EOFError) as e:
+            print(f"Erro DOCX: {e}")
+            return "", "DOCX_CORRUPTED"
+
+        return "\n".join(lines), None
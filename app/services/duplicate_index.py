@@ -0,0 +1,184 @@
+import io
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from PIL import Image, ImageOps
+from app.core.memory import open_reduced
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Matriz da DCT-II ortonormal (n x n), usada no pHash."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0, :] = np.sqrt(1.0 / n)
+    return matrix
+
+
+class PerceptualHasher:
+    """
+    pHash de 64 bits (DCT 32x32 -> bloco 8x8 de baixa frequência).
+    Resiste a recompressão (WhatsApp), redimensionamento e pequenas variações de luz.
+    """
+    HASH_SIZE = 8
+    SAMPLE_SIZE = 32
+    _DCT = _dct_matrix(SAMPLE_SIZE)
+
+    def hash_image(self, image_bytes: bytes) -> Optional[int]:
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                img = open_reduced(img, self.SAMPLE_SIZE * 4)
+                img = ImageOps.exif_transpose(img).convert("L")
+                img = img.resize((self.SAMPLE_SIZE, self.SAMPLE_SIZE), Image.Resampling.LANCZOS)
+                pixels = np.asarray(img, dtype=np.float64)
+        except Exception as e:
+            print(f"Aviso pHash: {e}")
+            return None
+
+        dct = self._DCT @ pixels @ self._DCT.T
+        low_freq = dct[:self.HASH_SIZE, :self.HASH_SIZE].flatten()
+        # Ignora o componente DC (brilho médio) no cálculo da mediana
+        bits = low_freq > np.median(low_freq[1:])
+        return int("".join("1" if b else "0" for b in bits), 2)
+
+
+class _BKTree:
+    """BK-tree sobre distância de Hamming (busca por raio sem varrer o índice todo)."""
+
+    def __init__(self):
+        self.root = None  # [hash, {distancia: no_filho}]
+
+    def add(self, value: int):
+        if self.root is None:
+            self.root = [value, {}]
+            return
+        node = self.root
+        while True:
+            distance = bin(node[0] ^ value).count("1")
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [value, {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> list[tuple[int, int]]:
+        """Retorna [(distancia, hash)] dentro do raio, ordenado pela distância."""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = bin(node[0] ^ value).count("1")
+            if distance <= max_distance:
+                found.append((distance, node[0]))
+            for child_distance, child in node[1].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(found)
+
+
+def text_signature(text: str) -> dict:
+    """
+    Assinatura do texto OCR para confirmar reenvios: palavras e, à parte, os números
+    (CPF, conta, datas, valores), que são o que muda entre clientes no mesmo modelo de documento.
+    """
+    normalized = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii").lower()
+    tokens = re.findall(r"\w+", normalized)
+    return {
+        "words": frozenset(t for t in tokens if len(t) >= 3 and not t.isdigit()),
+        "numbers": frozenset(re.sub(r"\D", "", t) for t in re.findall(r"[\d./-]{3,}", normalized) if sum(c.isdigit() for c in t) >= 3),
+    }
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def same_document_text(a: dict, b: dict, min_word_similarity: float = 0.85, min_number_similarity: float = 0.9) -> bool:
+    """Mesmo documento = vocabulário quase igual E os mesmos números (mesmo modelo com outro titular não passa)."""
+    if len(a["numbers"]) < 3 or len(b["numbers"]) < 3:
+        return False
+    return (_jaccard(a["words"], b["words"]) >= min_word_similarity
+            and _jaccard(a["numbers"], b["numbers"]) >= min_number_similarity)
+
+
+class NearDuplicateIndex:
+    """
+    Índice em memória (por instância) de veredictos já emitidos, particionado por cliente + expected_type.
+    Reaproveitamento só com confirmação: bytes idênticos (sha256) ou, para fotos, pHash próximo
+    (candidato) E texto OCR confirmado por same_document_text. O pHash sozinho nunca decide:
+    documentos diferentes no mesmo modelo (ou com o mesmo logotipo) têm hashes quase iguais.
+    Quando lotado, descarta as entradas mais antigas e reconstrói a árvore.
+    """
+
+    def __init__(self, max_entries_per_partition: int = 5000):
+        self.max_entries_per_partition = max_entries_per_partition
+        self._entries: dict[str, OrderedDict] = {}  # partição -> {sha256: entrada}
+        self._trees: dict[str, _BKTree] = {}
+        self._by_phash: dict[str, dict] = {}  # partição -> {phash: set(sha256)}
+        self._lock = threading.Lock()
+
+    def lookup_exact(self, file_sha256: str, partition: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(partition, {}).get(file_sha256)
+            return {"match": "bytes_identicos", **entry} if entry else None
+
+    def lookup_confirmed(self, phash: int, signature: dict, partition: str, max_distance: int) -> Optional[dict]:
+        """Candidatos pelo pHash, confirmados pelo texto OCR."""
+        if phash is None or signature is None:
+            return None
+        with self._lock:
+            tree = self._trees.get(partition)
+            if tree is None:
+                return None
+            for distance, match_hash in tree.search(phash, max_distance):
+                for file_sha256 in self._by_phash[partition].get(match_hash, ()):
+                    entry = self._entries[partition][file_sha256]
+                    if entry["signature"] and same_document_text(signature, entry["signature"]):
+                        return {"match": "texto_ocr_confirmado", "distance": distance, **entry}
+            return None
+
+    def add(self, file_sha256: str, phash: Optional[int], signature: Optional[dict], partition: str, file_name: str, result: dict):
+        with self._lock:
+            entries = self._entries.setdefault(partition, OrderedDict())
+            entries[file_sha256] = {
+                "file_name": file_name,
+                "phash": f"{phash:016x}" if phash is not None else None,
+                "signature": signature,
+                "result": result,
+            }
+            entries.move_to_end(file_sha256)
+
+            if len(entries) > self.max_entries_per_partition:
+                for _ in range(len(entries) - self.max_entries_per_partition // 2):
+                    entries.popitem(last=False)
+                self._rebuild(partition)
+            elif phash is not None:
+                self._trees.setdefault(partition, _BKTree()).add(phash)
+                self._by_phash.setdefault(partition, {}).setdefault(phash, set()).add(file_sha256)
+
+    def _rebuild(self, partition: str):
+        tree, by_phash = _BKTree(), {}
+        for file_sha256, entry in self._entries[partition].items():
+            if entry["phash"] is not None:
+                value = int(entry["phash"], 16)
+                tree.add(value)
+                by_phash.setdefault(value, set()).add(file_sha256)
+        self._trees[partition] = tree
+        self._by_phash[partition] = by_phash
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._trees.clear()
+            self._by_phash.clear()
+
+
+# O serviço é instanciado a cada requisição; o índice precisa viver no módulo
+duplicate_index = NearDuplicateIndex()
@@ -0,0 +1,98 @@
+import io
+import numpy as np
+from PIL import Image, ImageOps
+from app.core.constants import IMAGE_QUALITY_THRESHOLDS, IMAGE_QUALITY_DEFAULTS
+from app.core.memory import open_reduced
+
+
+class ImageQualityChecker:
+    """
+    Pré-checagem local (Pillow/NumPy) da qualidade de fotos antes do OCR pago.
+    Rejeita imagens borradas, escuras/estouradas, pequenas demais ou sem documento aparente.
+    """
+    # Lado máximo usado nas métricas (reduz custo sem afetar a decisão)
+    ANALYSIS_MAX_SIDE = 1024
+
+    def _thresholds_for(self, expected_type: str) -> dict:
+        """Mescla os limites padrão com os específicos do tipo de documento."""
+        thresholds = dict(IMAGE_QUALITY_DEFAULTS)
+        thresholds.update(IMAGE_QUALITY_THRESHOLDS.get(expected_type or "", {}))
+        return thresholds
+
+    def _load_grayscale(self, image_bytes: bytes) -> tuple[np.ndarray, tuple[int, int]]:
+        """Abre a imagem, aplica a orientação EXIF e devolve a matriz em tons de cinza reduzida."""
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            original_size = img.size
+            # Reduz na decodificação (JPEG) ou antes de converter (PNG): nunca uma cópia em resolução cheia
+            img = open_reduced(img, self.ANALYSIS_MAX_SIDE)
+            img = ImageOps.exif_transpose(img).convert("L")
+            img.thumbnail((self.ANALYSIS_MAX_SIDE, self.ANALYSIS_MAX_SIDE))
+            return np.asarray(img, dtype=np.float32), original_size
+
+    def _laplacian_variance(self, gray: np.ndarray) -> float:
+        """Variância do Laplaciano (4-vizinhos): valores baixos indicam imagem borrada."""
+        lap = (
+            gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+            - 4.0 * gray[1:-1, 1:-1]
+        )
+        return float(lap.var())
+
+    def _document_area_ratio(self, gray: np.ndarray) -> float:
+        """
+        Estima a fração da foto ocupada pelo documento: bounding box das regiões
+        com bordas (texto/contornos), ignorando fundo liso.
+        """
+        grad_x = np.abs(np.diff(gray, axis=1))
+        grad_y = np.abs(np.diff(gray, axis=0))
+        edges = (grad_x[:-1, :] + grad_y[:, :-1]) > 40.0
+
+        rows = np.flatnonzero(edges.mean(axis=1) > 0.01)
+        cols = np.flatnonzero(edges.mean(axis=0) > 0.01)
+        if rows.size == 0 or cols.size == 0:
+            return 0.0
+
+        box_area = (rows[-1] - rows[0] + 1) * (cols[-1] - cols[0] + 1)
+        return float(box_area / edges.size)
+
+    def check(self, image_bytes: bytes, expected_type: str = "") -> dict:
+        """
+        Retorna {"valid": bool, "error": str, "metrics": dict}.
+        Se a imagem não puder ser decodificada localmente, não bloqueia (o OCR decide).
+        """
+        thresholds = self._thresholds_for(expected_type)
+
+        try:
+            gray, (width, height) = self._load_grayscale(image_bytes)
+        except Exception as e:
+            print(f"Aviso Qualidade de Imagem: {e}")
+            return {"valid": True, "metrics": {}}
+
+        ink_level, paper_level = (float(v) for v in np.percentile(gray, (0.5, 99.5)))
+        metrics = {
+            "width": width,
+            "height": height,
+            "blur_score": round(self._laplacian_variance(gray), 2),
+            "mean_brightness": round(float(gray.mean()), 2),
+            "ink_level": round(ink_level, 2),
+            "paper_level": round(paper_level, 2),
+            "contrast_spread": round(paper_level - ink_level, 2),
+            "document_area_ratio": round(self._document_area_ratio(gray), 4),
+        }
+
+        if min(width, height) < thresholds["min_side_px"]:
+            return {"valid": False, "error": "Resolução muito baixa.", "metrics": metrics}
+        if metrics["blur_score"] < thresholds["min_blur_score"]:
+            return {"valid": False, "error": "Imagem borrada.", "metrics": metrics}
+        # Escura: nem o ponto mais claro (papel ou texto claro do modo escuro) chega a um cinza legível
+        if metrics["paper_level"] < thresholds["min_paper_level"]:
+            return {"valid": False, "error": "Imagem escura.", "metrics": metrics}
+        if metrics["ink_level"] > thresholds["max_ink_level"]:
+            return {"valid": False, "error": "Imagem superexposta.", "metrics": metrics}
+        if metrics["contrast_spread"] < thresholds["min_contrast_spread"]:
+            # Sem contraste: o lado do histograma em que a foto ficou diz se faltou ou sobrou luz
+            error = "Imagem escura." if metrics["mean_brightness"] < 128 else "Imagem superexposta."
+            return {"valid": False, "error": error, "metrics": metrics}
+        if metrics["document_area_ratio"] < thresholds["min_document_area_ratio"]:
+            return {"valid": False, "error": "Documento muito pequeno na foto.", "metrics": metrics}
+
+        return {"valid": True, "metrics": metrics}
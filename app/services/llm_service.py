@@ -2,22 +2,50 @@ import json
 import base64
 import re
 import io
+import copy
+import hashlib
+import threading
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from pypdf import PdfReader
-from docx import Document
 from azure.ai.vision.imageanalysis import ImageAnalysisClient
 from azure.ai.vision.imageanalysis.models import VisualFeatures
 from azure.core.credentials import AzureKeyCredential
 from openai import AzureOpenAI, APIConnectionError, RateLimitError, BadRequestError, APITimeoutError
+from PIL import Image
 from app.core.config import settings
+from app.core.constants import MEMORY_COST_FACTORS
+from app.core.memory import base64_length, estimate_request_memory, image_decode_memory, open_reduced
 from app.services.prompt_builder import PromptBuilder
-from app.core.exceptions import LLMProcessingError
+from app.services.image_quality import ImageQualityChecker
+from app.services.duplicate_index import PerceptualHasher, duplicate_index, text_signature
+from app.services.docx_extractor import DocxStreamExtractor
+from app.services.recording import CassetteStore, RecordingLLMClient, RecordingOCRClient
+from app.services.model_cascade import ModelCascade, cascade_metrics
+from app.services.pdf_segmenter import PdfSegmenter
+from app.services.document_cropper import DocumentCropper
+from app.services.local_classifier import local_classifier, verdict_log, normalize_text, REJECTED_LABEL
+from app.core.exceptions import LLMProcessingError, CassetteMissError
 import unicodedata
 
+# Vira False na primeira recusa do Azure a Structured Outputs (api-version antiga); vale para o processo
+_structured_outputs_supported = True
+
 class DocumentAnalyzerService:
     # --- CONSTANTES DE CONFIGURAÇÃO ---
     MAX_FILE_SIZE_MB = 15
     MAX_TEXT_LENGTH = 25000  # Limita o texto enviado à LLM para economizar tokens
+    # Envelope do GPT-4o em detail=high (lado maior 2048, menor 768): acima disso a imagem é reduzida
+    # pelo próprio modelo, então enviamos já reduzida (payload e memória bem menores)
+    LLM_IMAGE_MAX_SIDE = 2048
+    LLM_IMAGE_MIN_SIDE = 768
+
+    # Termos de "Nada Consta"/documento vazio (auditoria da resposta e trava do classificador local)
+    NEGATIVE_TERMS = [
+        "não há informe", "não existe", "nada consta",
+        "ausência de dados", "nenhum registro", "sem dados",
+        "declaração não entregue", "não foram encontrados"
+    ]
     
     # Assinaturas Binárias (Magic Numbers) para validação de segurança
     MAGIC_NUMBERS = {
@@ -42,6 +70,21 @@ class DocumentAnalyzerService:
             endpoint=settings.AZURE_CV_ENDPOINT,
             credential=AzureKeyCredential(settings.AZURE_CV_KEY)
         )
+        # Record/replay: grava respostas reais ou reproduz offline (perf/regressão sem Azure)
+        if settings.TRANSPORT_MODE in ("record", "replay"):
+            store = CassetteStore(settings.CASSETTE_DIR)
+            self.llm_client = RecordingLLMClient(self.llm_client, store, settings.TRANSPORT_MODE, settings.REPLAY_LATENCY_SCALE)
+            self.ocr_client = RecordingOCRClient(self.ocr_client, store, settings.TRANSPORT_MODE, settings.REPLAY_LATENCY_SCALE)
+        # Consumo real de tokens desta requisição (conciliação dos limites por cliente)
+        self.llm_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        self._usage_lock = threading.Lock()
+        # Cascata de modelos (deployment rápido primeiro, GPT-4o quando necessário)
+        self.cascade = ModelCascade()
+        # Pré-checagem local de qualidade (Pillow/NumPy), antes de pagar pelo OCR
+        self.quality_checker = ImageQualityChecker()
+        self.hasher = PerceptualHasher()
+        # Recorte/endireitamento da foto pela geometria do OCR antes da chamada visual
+        self.cropper = DocumentCropper()
 
     def _normalize_text(self, text: str) -> str:
         """
@@ -96,22 +139,42 @@ class DocumentAnalyzerService:
 
     def _extract_text_cloud(self, image_bytes: bytes) -> str:
         """Usa Azure Vision para OCR de alta precisão em imagens."""
+        return self._analyze_image_cloud(image_bytes)[0]
+
+    def _analyze_image_cloud(self, image_bytes: bytes) -> tuple[str, list[dict]]:
+        """OCR do Azure Vision mantendo a geometria: (texto, [{"text", "polygon": [(x, y), ...]}])."""
         try:
             result = self.ocr_client.analyze(
                 image_data=image_bytes,
                 visual_features=[VisualFeatures.READ]
             )
             if result.read:
-                return " ".join([line.text for block in result.read.blocks for line in block.lines])
-            return ""
+                lines = [
+                    {
+                        "text": line.text,
+                        "polygon": [(p.x, p.y) for p in (getattr(line, "bounding_polygon", None) or [])]
+                    }
+                    for block in result.read.blocks for line in block.lines
+                ]
+                return " ".join(line["text"] for line in lines), lines
+            return "", []
+        except CassetteMissError:
+            # Replay sem gravação não é "imagem sem texto": a execução precisa falhar
+            raise
         except Exception as e:
             print(f"Aviso OCR Azure: {e}")
-            return ""
+            return "", []
 
-    def _extract_text_from_pdf(self, file_bytes: bytes) -> tuple[str, str]:
-        """Extrai texto de PDF de forma híbrida e robusta."""
-        text_content = ""
+    def _extract_text_from_pdf(self, file_bytes: bytes, image_budget_bytes: int = None) -> tuple[str, str]:
+        """
+        Extrai texto de PDF de forma híbrida e robusta.
+        Para assim que o texto atinge MAX_TEXT_LENGTH e, se image_budget_bytes for informado,
+        deixa de decodificar imagens embutidas quando o orçamento de memória se esgota.
+        """
+        text_parts = []
+        text_length = 0
         images_found = False
+        image_bytes_used = 0
         
         try:
             reader = PdfReader(io.BytesIO(file_bytes))
@@ -123,10 +186,14 @@ class DocumentAnalyzerService:
                     return "", "PDF_PASSWORD_PROTECTED"
 
             for page in reader.pages:
+                if text_length >= self.MAX_TEXT_LENGTH:
+                    break
+
                 try:
                     extracted = page.extract_text()
                     if extracted:
-                        text_content += extracted + "\n"
+                        text_parts.append(extracted + "\n")
+                        text_length += len(extracted) + 1
                 except:
                     pass
                 
@@ -134,12 +201,24 @@ class DocumentAnalyzerService:
                     if hasattr(page, 'images') and page.images:
                         for image in page.images:
                             images_found = True
-                            ocr_text = self._extract_text_cloud(image.data)
+                            if text_length >= self.MAX_TEXT_LENGTH:
+                                break
+                            if image_budget_bytes is not None and image_bytes_used >= image_budget_bytes:
+                                break
+                            image_data = image.data
+                            image_bytes_used += len(image_data)
+                            ocr_text = self._extract_text_cloud(image_data)
+                            # Libera a imagem decodificada antes da próxima
+                            del image_data
                             if ocr_text:
-                                text_content += f"\n[CONTEÚDO DE IMAGEM OCR]: {ocr_text}\n"
+                                text_parts.append(f"\n[CONTEÚDO DE IMAGEM OCR]: {ocr_text}\n")
+                                text_length += len(ocr_text) + 30
+                except CassetteMissError:
+                    raise
                 except:
                     pass 
             
+            text_content = "".join(text_parts)
             if not text_content.strip():
                 if not images_found:
                     return "", "PDF_EMPTY_CONTENT"
@@ -147,6 +226,8 @@ class DocumentAnalyzerService:
                             
             return text_content, None
 
+        except CassetteMissError:
+            raise
         except Exception as e:
             if "password" in str(e).lower():
                 return "", "PDF_PASSWORD_PROTECTED"
@@ -169,31 +250,21 @@ class DocumentAnalyzerService:
 
         return True
 
-    def _extract_text_from_docx(self, file_bytes: bytes) -> str:
-        """Lê arquivos Word (.docx)."""
-        try:
-            doc = Document(io.BytesIO(file_bytes))
-            return "\n".join([para.text for para in doc.paragraphs])
-        except Exception:
-            return ""
+    def _extract_text_from_docx(self, file_bytes: bytes) -> tuple[str, str]:
+        """Lê arquivos Word (.docx) em streaming. O formato OLE antigo (.doc) é rejeitado."""
+        return DocxStreamExtractor(max_chars=self.MAX_TEXT_LENGTH).extract(file_bytes)
 
     def _audit_negative_results(self, result_json: dict) -> tuple[bool, str]:
         """Auditoria de Segurança: Verifica se o documento é um 'Nada Consta' ou 'Vazio'."""
         reasoning = str(result_json.get("reasoning", "")).lower()
         message = str(result_json.get("message", "")).lower()
         
-        negative_terms = [
-            "não há informe", "não existe", "nada consta", 
-            "ausência de dados", "nenhum registro", "sem dados",
-            "declaração não entregue", "não foram encontrados"
-        ]
-        
-        for term in negative_terms:
+        for term in self.NEGATIVE_TERMS:
             if term in reasoning or term in message:
                 return False, f"Documento indica ausência de dados: '{term}'."
                 
         if result_json.get("result") == "INVALID":
-            return False, result_json.get("reasoning", "Documento inválido.")
+            return False, result_json.get("reasoning") or "Documento inválido."
             
         return True, "OK"
 
@@ -206,32 +277,289 @@ class DocumentAnalyzerService:
         return "".join([c for c in nfkd_form if not unicodedata.combining(c)]).lower().strip()
 
 
-    def validate_document(self, file_base64: str, expected_type: str, file_name: str = "arquivo.jpg") -> dict:
-        # --- 1. Validações de Entrada ---
-        if not file_base64 or len(file_base64) < 100:
-             return {"status": "error", "message": "Arquivo inválido ou vazio."}
+    def _canonical_type(self, document_type: str) -> str:
+        """Tipo sem acentos, em minúsculas e com sinônimos resolvidos."""
+        normalized = self._normalize_text(str(document_type))
+
+        # Mapa de Sinônimos (Resolver 'Endereço vs Residência' e 'Holerite vs Contracheque')
+        synonym_map = {
+            "endereco": "residencia",
+            "residencia": "residencia",
+            "contracheque": "holerite",
+            "holerite": "holerite"
+        }
+
+        # Substitui sinônimos na string normalizada
+        for term, canonical in synonym_map.items():
+            if term in normalized:
+                normalized = normalized.replace(term, canonical)
+        return normalized
+
+    def _types_match(self, detected_raw: str, expected_type: str) -> bool:
+        """Compara tipo detectado e esperado sem acentos e resolvendo sinônimos."""
+        # Normaliza ambos (remove acentos, minúsculo, sinônimos)
+        detected_norm = self._canonical_type(detected_raw)
+        expected_norm = self._canonical_type(expected_type)
+
+        return (expected_norm in detected_norm) or (detected_norm in expected_norm)
+
+    def _request_classification(self, deployment: str, messages: list, compact: bool) -> dict:
+        """Chama o LLM e devolve o JSON da resposta (levanta exceção se a chamada ou o JSON falharem)."""
+        global _structured_outputs_supported
+        max_tokens = settings.LLM_COMPACT_MAX_TOKENS if compact else settings.LLM_VERBOSE_MAX_TOKENS
+        use_schema = compact and _structured_outputs_supported
 
         try:
-            file_data = base64.b64decode(file_base64)
-        except:
-            return {"status": "error", "message": "Falha na decodificação do arquivo (Base64 corrompido)."}
+            response = self.llm_client.chat.completions.create(
+                model=deployment,
+                messages=messages,
+                max_tokens=max_tokens, temperature=0.0,
+                response_format=PromptBuilder.build_response_format(use_schema)
+            )
+        except BadRequestError as e:
+            if not use_schema or "response_format" not in str(e):
+                raise
+            print(f"Aviso: Structured Outputs indisponível, usando json_object. ({e})")
+            _structured_outputs_supported = False
+            response = self.llm_client.chat.completions.create(
+                model=deployment,
+                messages=messages,
+                max_tokens=max_tokens, temperature=0.0,
+                response_format=PromptBuilder.build_response_format(False)
+            )
+        self._record_usage(response)
+        return json.loads(response.choices[0].message.content)
+
+    def _record_usage(self, response):
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        with self._usage_lock:
+            for key in self.llm_usage:
+                self.llm_usage[key] += getattr(usage, key, 0) or 0
+
+    def _classify(self, messages: list, expected_type, compact: bool = False) -> dict:
+        """
+        Classificação com cascata: tipos roteados como 'cascade' vão ao deployment rápido e
+        escalonam ao principal se a confiança não for 'high', se is_match divergir da checagem
+        de tipos ou se a chamada/JSON falhar. expected_type em lista = modo multi-documento
+        (roteia pelos tipos esperados, não pelo rótulo do prompt).
+        """
+        expected_types = expected_type if isinstance(expected_type, list) else [expected_type]
+        metrics_key = cascade_metrics.MULTI_DOCUMENT_KEY if isinstance(expected_type, list) else expected_type
+        route = self.cascade.route_for(expected_type)
+        if route != "cascade":
+            result_json = self._request_classification(settings.AZURE_OPENAI_DEPLOYMENT, messages, compact)
+            result_json["model_deployment"] = settings.AZURE_OPENAI_DEPLOYMENT
+            cascade_metrics.record(metrics_key, route)
+            return result_json
+
+        try:
+            result_json = self._request_classification(settings.AZURE_OPENAI_FAST_DEPLOYMENT, messages, compact)
+            detected = str(result_json.get("detected_type") or "")
+            type_matches = bool(detected) and any(self._types_match(detected, t) for t in expected_types)
+            reason = self.cascade.escalation_reason(result_json, type_matches)
+        except json.JSONDecodeError:
+            reason = "json_invalido"
+        except CassetteMissError:
+            raise
+        except Exception as e:
+            print(f"Aviso modelo rápido: {e}")
+            reason = "erro_modelo_rapido"
+
+        cascade_metrics.record(metrics_key, route, reason)
+        if not reason:
+            result_json["model_deployment"] = settings.AZURE_OPENAI_FAST_DEPLOYMENT
+            return result_json
+
+        result_json = self._request_classification(settings.AZURE_OPENAI_DEPLOYMENT, messages, compact)
+        result_json["model_deployment"] = settings.AZURE_OPENAI_DEPLOYMENT
+        result_json["escalation_reason"] = reason
+        return result_json
+
+    @staticmethod
+    def _decode_content(file_content: str | bytes) -> bytes:
+        """Bytes do arquivo: upload binário já chega cru; JSON traz Base64 (None se corrompido)."""
+        if isinstance(file_content, (bytes, bytearray, memoryview)):
+            return bytes(file_content)
+        try:
+            return base64.b64decode(file_content)
+        except Exception:
+            return None
+
+    def _prepare_image_for_llm(self, image_bytes: bytes, image_base64: str = None) -> str:
+        """
+        Monta a data URL da imagem para o LLM. Fotos maiores que o envelope do GPT-4o são reduzidas
+        e recomprimidas, evitando uma segunda cópia grande do Base64 dentro do payload.
+        image_base64 vem pronto no upload JSON; no binário só é gerado se a imagem seguir sem redução.
+        """
+        def original_base64() -> str:
+            return image_base64 or base64.b64encode(image_bytes).decode("ascii")
+
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                width, height = img.size
+                scale = min(self.LLM_IMAGE_MAX_SIDE / max(width, height), self.LLM_IMAGE_MIN_SIDE / min(width, height))
+                if scale >= 1:
+                    mime = "png" if img.format == "PNG" else "jpeg"
+                    return f"data:image/{mime};base64,{original_base64()}"
+
+                img = open_reduced(img, self.LLM_IMAGE_MAX_SIDE).convert("RGB")
+                img.thumbnail((int(width * scale), int(height * scale)))
+                buffer = io.BytesIO()
+                img.save(buffer, format="JPEG", quality=90)
+                return f"data:image/jpeg;base64,{base64.b64encode(buffer.getbuffer()).decode('ascii')}"
+        except Exception as e:
+            print(f"Aviso redução de imagem: {e}")
+            return f"data:image/jpeg;base64,{original_base64()}"
+
+    def _local_prediction(self, extracted_text: str) -> dict:
+        """Pré-classificação pelo modelo local (None se não houver modelo configurado)."""
+        model = local_classifier.get()
+        if model is None:
+            return None
+        try:
+            return model.predict(extracted_text)
+        except Exception as e:
+            print(f"Aviso classificador local: {e}")
+            return None
+
+    def _can_skip_llm(self, prediction: dict, extracted_text: str, expected_type: str, compact: bool) -> bool:
+        """
+        O LLM só é dispensado para aprovar: modelo treinado com veredictos e calibrado, tipo aprovado previsto
+        igual ao esperado, confiança acima do limite, modo compacto (auditoria sempre chama o LLM) e
+        nenhum termo de "Nada Consta" no texto.
+        """
+        if not settings.LOCAL_CLASSIFIER_SKIP_LLM or not compact:
+            return False
+        metadata = local_classifier.get().metadata
+        if metadata.get("label_source") != "veredicto" or not metadata.get("calibrated"):
+            return False
+        if prediction["confidence"] < settings.LOCAL_CLASSIFIER_SKIP_CONFIDENCE:
+            return False
+        # Tipo idêntico (após sinônimos): "RG" contido em "RG de Idoso" não basta, as regras do subtipo são do LLM
+        if self._canonical_type(prediction["label"]) != self._canonical_type(expected_type):
+            return False
+        normalized = normalize_text(extracted_text)
+        return not any(normalize_text(term) in normalized for term in self.NEGATIVE_TERMS)
+
+    def _log_verdict(self, extracted_text: str, expected_type: str, result_json: dict, final_status: str):
+        """Registra o veredicto do LLM para o treino offline do classificador local."""
+        if verdict_log is None:
+            return
+        try:
+            verdict_log.append(
+                extracted_text, str(expected_type), str(result_json.get("detected_type", "")),
+                final_status, bool(result_json.get("is_match", False)), result_json.get("model_deployment")
+            )
+        except Exception as e:
+            print(f"Aviso registro de veredicto: {e}")
+
+    def _ocr_layout_hints(self, image_bytes: bytes, ocr_lines: list) -> dict:
+        """Geometria do OCR resumida (área de texto, inclinação) para diagnóstico e dicas de layout."""
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                return self.cropper.layout_hints(ocr_lines, img.size)
+        except Exception:
+            return None
+
+    def _duplicate_context(self, file_data: bytes, extension: str, expected_type: str, tenant: str) -> dict:
+        """Chaves do índice de reenvios: partição por cliente + tipo, sha256 dos bytes e pHash (só fotos)."""
+        return {
+            "partition": f"{tenant}|{expected_type}",
+            "sha256": hashlib.sha256(file_data).hexdigest(),
+            # PDFs/Word só são reaproveitados com bytes idênticos (imagens embutidas costumam ser só o logotipo)
+            "phash": self.hasher.hash_image(file_data) if extension in ['jpg', 'png'] else None,
+            "signature": None,
+        }
+
+    def _reused_verdict(self, match: dict) -> dict:
+        result = copy.deepcopy(match["result"])
+        result.setdefault("data", {})
+        result["data"]["reused_verdict"] = True
+        result["data"]["duplicate_of"] = {
+            "file_name": match["file_name"],
+            "match": match["match"],
+            "phash": match["phash"],
+            "hamming_distance": match.get("distance", 0)
+        }
+        return result
+
+    def _remember_verdict(self, duplicate_ctx: dict, file_name: str, result: dict) -> dict:
+        """Guarda o veredicto final do LLM no índice de reenvios."""
+        if duplicate_ctx is not None:
+            duplicate_index.add(
+                duplicate_ctx["sha256"], duplicate_ctx["phash"], duplicate_ctx["signature"],
+                duplicate_ctx["partition"], file_name, copy.deepcopy(result)
+            )
+        return result
+
+    def validate_document(self, file_content: str | bytes, expected_type: str, file_name: str = "arquivo.jpg", response_mode: str = None, tenant: str = "anonimo") -> dict:
+        """file_content: Base64 (JSON do front) ou os bytes crus do upload binário, sem recodificar."""
+        # "compact" (padrão, rápido) ou "verbose" (raciocínio completo para auditoria/debug)
+        response_mode = response_mode or settings.LLM_RESPONSE_MODE
+        compact = response_mode != "verbose"
+
+        # --- 1. Validações de Entrada ---
+        encoded_length = base64_length(file_content or "")
+        if not file_content or encoded_length < 100:
+             return {"status": "error", "message": "Arquivo inválido ou vazio."}
 
         # Identificação de Extensão e Segurança
         extension = file_name.split('.')[-1].lower()
         if extension == 'jpeg': extension = 'jpg'
+
+        # Rejeita arquivos grandes demais antes de alocar os bytes decodificados
+        if encoded_length * 3 // 4 > (self.MAX_FILE_SIZE_MB * 1024 * 1024):
+            return {"status": "error", "message": f"Arquivo rejeitado: O arquivo excede o limite de {self.MAX_FILE_SIZE_MB}MB."}
+
+        # Orçamento de memória por requisição: PDFs degradam (menos imagens OCR), demais formatos são rejeitados
+        memory_budget = settings.REQUEST_MEMORY_BUDGET_MB * 1024 * 1024
+        estimated_memory = estimate_request_memory(encoded_length, extension, MEMORY_COST_FACTORS)
+        pdf_image_budget = None
+        if estimated_memory > memory_budget:
+            # Base64 + bytes decodificados + leitor pypdf ficam fora do orçamento de imagens
+            pdf_image_budget = memory_budget - encoded_length - 2 * (encoded_length * 3 // 4)
+            if extension != 'pdf' or pdf_image_budget <= 0:
+                return {"status": "error", "message": "Arquivo rejeitado: O arquivo excede o limite de memória por requisição."}
+
+        file_data = self._decode_content(file_content)
+        if file_data is None:
+            return {"status": "error", "message": "Falha na decodificação do arquivo (Base64 corrompido)."}
         
         # Validação de integridade (Agora permite extensão trocada se o arquivo for seguro)
         integrity_check = self._validate_file_integrity(file_data, extension)
         if not integrity_check["valid"]:
              return {"status": "error", "message": f"Arquivo rejeitado: {integrity_check.get('error')}"}
 
+        # Fotos: o que pesa é a imagem decodificada (largura x altura x bandas, lido do cabeçalho), não o arquivo.
+        # O maior decode é o do recorte (WORK_MAX_SIDE); JPEG chega reduzido pelo decoder, PNG em resolução cheia
+        if extension not in ['pdf', 'docx', 'doc']:
+            try:
+                decoded_memory = image_decode_memory(file_data, max(self.cropper.WORK_MAX_SIDE, self.LLM_IMAGE_MAX_SIDE))
+            except Exception:
+                decoded_memory = 0  # Sem cabeçalho legível: a pré-checagem/OCR decidem
+            if estimated_memory + decoded_memory > memory_budget:
+                return {"status": "error", "message": "Arquivo rejeitado: A imagem excede o limite de memória por requisição (resolução muito alta)."}
+
+        # Reenvio do mesmo documento pelo mesmo cliente: bytes idênticos reaproveitam o veredicto já aqui;
+        # fotos re-tiradas/recomprimidas só depois de o texto OCR confirmar (ver abaixo)
+        duplicate_ctx = None
+        # Requisições de auditoria (verbose) sempre recebem uma análise nova e completa
+        if settings.DUPLICATE_INDEX_ENABLED and compact and str(expected_type).lower() != "outros":
+            duplicate_ctx = self._duplicate_context(file_data, extension, str(expected_type), tenant)
+            match = duplicate_index.lookup_exact(duplicate_ctx["sha256"], duplicate_ctx["partition"])
+            if match:
+                return self._reused_verdict(match)
+
         # --- 2. Extração de Conteúdo ---
         extracted_text = ""
+        ocr_lines = []
         is_image = False
         error_flag = None
 
         if extension == 'pdf':
-            extracted_text, error_flag = self._extract_text_from_pdf(file_data)
+            extracted_text, error_flag = self._extract_text_from_pdf(file_data, pdf_image_budget)
             if error_flag:
                 msg_map = {
                     "PDF_PASSWORD_PROTECTED": "PDF protegido por senha.",
@@ -241,10 +569,28 @@ class DocumentAnalyzerService:
                 return {"status": "error", "message": msg_map.get(error_flag, "Erro ao ler PDF.")}
                 
         elif extension in ['docx', 'doc']:
-            extracted_text = self._extract_text_from_docx(file_data)
+            extracted_text, error_flag = self._extract_text_from_docx(file_data)
+            if error_flag:
+                msg_map = {
+                    "DOC_LEGACY_FORMAT": "Formato Word 97-2003 (.doc) não suportado. Salve o arquivo como .docx ou PDF.",
+                    "DOCX_CORRUPTED": "Arquivo Word corrompido."
+                }
+                return {"status": "error", "message": msg_map.get(error_flag, "Erro ao ler arquivo Word.")}
         else:
             is_image = True # JPG, PNG
-            extracted_text = self._extract_text_cloud(file_data)
+            if settings.IMAGE_QUALITY_CHECK_ENABLED:
+                quality = self.quality_checker.check(file_data, expected_type)
+                if not quality["valid"]:
+                    return {
+                        "status": "error",
+                        "message": "Qualidade Insuficiente: Não foi possível ler o conteúdo. Imagem borrada ou escura.",
+                        "data": {
+                            "detected_type": "Ilegível",
+                            "reasoning": quality["error"],
+                            "quality_metrics": quality["metrics"]
+                        }
+                    }
+            extracted_text, ocr_lines = self._analyze_image_cloud(file_data)
 
         # Check de Legibilidade Global
         if not self._is_legible_text(extracted_text, is_image):
@@ -254,6 +600,15 @@ class DocumentAnalyzerService:
                 "data": {"detected_type": "Ilegível", "reasoning": "Texto insuficiente."}
             }
 
+        if duplicate_ctx is not None and is_image:
+            duplicate_ctx["signature"] = text_signature(extracted_text)
+            match = duplicate_index.lookup_confirmed(
+                duplicate_ctx["phash"], duplicate_ctx["signature"], duplicate_ctx["partition"],
+                settings.DUPLICATE_MAX_HAMMING_DISTANCE
+            )
+            if match:
+                return self._reused_verdict(match)
+
         if str(expected_type).lower() == "outros":
             return {
                 "status": "success",
@@ -265,56 +620,74 @@ class DocumentAnalyzerService:
         if len(extracted_text) > self.MAX_TEXT_LENGTH:
             extracted_text = extracted_text[:self.MAX_TEXT_LENGTH] + "\n...[Truncado]..."
 
-        system_prompt = PromptBuilder.build_verification_prompt(expected_type)
+        # Pré-classificação local (sem rede): indício para o LLM ou, se muito confiante, dispensa a chamada
+        local_prediction = self._local_prediction(extracted_text)
+        if local_prediction and self._can_skip_llm(local_prediction, extracted_text, expected_type, compact):
+            result_json = {
+                "detected_type": local_prediction["label"],
+                "is_match": True,
+                "confidence": "high",
+                "reasoning": None,
+                "response_mode": "compact",
+                "method": "local_classifier",
+                "file_type": extension,
+                "local_classifier": local_prediction
+            }
+            return self._remember_verdict(duplicate_ctx, file_name, {"status": "success", "message": "Validado com Sucesso", "data": result_json})
+
+        system_prompt = PromptBuilder.build_verification_prompt(expected_type, compact)
         
         user_content = []
+        crop_info = None
+        ocr_layout = None
         if is_image:
-            user_content = [{"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{file_base64}", "detail": "high"}}]
+            ocr_layout = self._ocr_layout_hints(file_data, ocr_lines)
+            llm_image, llm_image_base64 = file_data, file_content if isinstance(file_content, str) else None
+            if settings.OCR_CROP_ENABLED:
+                # Só a área do documento vai ao modelo (menos fundo = menos tiles de visão)
+                cropped, crop_info = self.cropper.crop(file_data, ocr_lines, settings.OCR_DESKEW_ENABLED)
+                if cropped:
+                    llm_image, llm_image_base64 = cropped, base64.b64encode(cropped).decode("ascii")
+            user_content = [{"type": "image_url", "image_url": {"url": self._prepare_image_for_llm(llm_image, llm_image_base64), "detail": "high"}}]
+            del llm_image, llm_image_base64
         else:
             user_content = [{"type": "text", "text": f"Conteúdo extraído ({extension}):\n\n{extracted_text}"}]
 
+        if (local_prediction and local_prediction["label"] != REJECTED_LABEL
+                and local_prediction["confidence"] >= settings.LOCAL_CLASSIFIER_HINT_CONFIDENCE):
+            user_content.append({"type": "text", "text": (
+                f"Pré-classificação automática (modelo local, confiança {local_prediction['confidence']:.2f}): "
+                f"provável '{local_prediction['label']}'. Use apenas como indício; decida pelo conteúdo do documento."
+            )})
+
+        # Os bytes decodificados não são mais necessários durante a chamada ao LLM
+        del file_data
+
         try:
-            response = self.llm_client.chat.completions.create(
-                model=settings.AZURE_OPENAI_DEPLOYMENT,
-                messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_content}],
-                max_tokens=300, temperature=0.0, response_format={"type": "json_object"}
-            )
-            
-            content = response.choices[0].message.content
-            result_json = json.loads(content)
+            messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_content}]
+            result_json = self._classify(messages, str(expected_type), compact)
+            result_json["response_mode"] = "compact" if compact else "verbose"
             result_json["method"] = "azure_llm_visual" if is_image else "azure_llm_text"
             result_json["file_type"] = extension
+            if ocr_layout:
+                result_json["ocr_layout"] = ocr_layout
+            if crop_info:
+                result_json["image_crop"] = crop_info
+            if local_prediction:
+                result_json["local_classifier"] = local_prediction
 
             # Auditoria de Nada Consta
             is_safe, safe_reason = self._audit_negative_results(result_json)
             if not is_safe:
-                return {"status": "error", "message": f"Reprovado: {safe_reason}", "data": result_json}
+                self._log_verdict(extracted_text, expected_type, result_json, "error")
+                return self._remember_verdict(duplicate_ctx, file_name, {"status": "error", "message": f"Reprovado: {safe_reason}", "data": result_json})
 
             # --- 4. VALIDAÇÃO DE TIPOS E SINÔNIMOS (CORREÇÃO FINAL) ---
             detected_raw = str(result_json.get("detected_type", ""))
-            
-            # Normaliza ambos (remove acentos, minúsculo)
-            detected_norm = self._normalize_text(detected_raw)
-            expected_norm = self._normalize_text(str(expected_type))
-
-            # Mapa de Sinônimos (Resolver 'Endereço vs Residência' e 'Holerite vs Contracheque')
-            synonym_map = {
-                "endereco": "residencia",
-                "residencia": "residencia",
-                "contracheque": "holerite",
-                "holerite": "holerite"
-            }
-
-            # Substitui sinônimos nas strings normalizadas
-            for term, canonical in synonym_map.items():
-                if term in expected_norm: 
-                    expected_norm = expected_norm.replace(term, canonical)
-                if term in detected_norm: 
-                    detected_norm = detected_norm.replace(term, canonical)
 
             # Lógica de Match
             ai_match = result_json.get("is_match", False)
-            type_matches = (expected_norm in detected_norm) or (detected_norm in expected_norm)
+            type_matches = self._types_match(detected_raw, expected_type)
 
             if ai_match and not type_matches:
                 # Só reprova se, mesmo após normalizar sinônimos, ainda for diferente (Ex: RG vs CPF)
@@ -328,9 +701,109 @@ class DocumentAnalyzerService:
                 
             else:
                 final_status = "error"
-                final_msg = f"Reprovado: {result_json.get('reasoning', 'Documento não atende aos requisitos.')}"
+                final_msg = f"Reprovado: {result_json.get('reasoning') or 'Documento não atende aos requisitos.'}"
 
-            return {"status": final_status, "message": final_msg, "data": result_json}
+            self._log_verdict(extracted_text, expected_type, result_json, final_status)
+            return self._remember_verdict(duplicate_ctx, file_name, {"status": final_status, "message": final_msg, "data": result_json})
 
+        except CassetteMissError:
+            raise
         except Exception as e:
-            return {"status": "error", "message": f"Erro Interno: {str(e)}", "data": {}}
\ No newline at end of file
+            return {"status": "error", "message": f"Erro Interno: {str(e)}", "data": {}}
+
+    def _classify_segment(self, pages: list[int], texts: list[str], expected_types: list[str]) -> dict:
+        """Classifica um grupo de páginas com contexto próprio (prompt pequeno e focado)."""
+        expected_label = "Um dos seguintes documentos: " + ", ".join(expected_types)
+        segment_text = "\n".join(texts[i] for i in pages)
+        if len(segment_text) > self.MAX_TEXT_LENGTH:
+            segment_text = segment_text[:self.MAX_TEXT_LENGTH] + "\n...[Truncado]..."
+
+        page_numbers = [i + 1 for i in pages]
+        if not self._is_legible_text(segment_text, is_image=False):
+            return {"pages": page_numbers, "detected_type": "Ilegível", "is_match": False, "confidence": "low"}
+
+        messages = [
+            {"role": "system", "content": PromptBuilder.build_verification_prompt(expected_label, compact=True)},
+            {"role": "user", "content": [{"type": "text", "text": f"Conteúdo extraído (páginas {page_numbers[0]}-{page_numbers[-1]} de um PDF):\n\n{segment_text}"}]}
+        ]
+        try:
+            result_json = self._classify(messages, list(expected_types), compact=True)
+        except CassetteMissError:
+            raise
+        except Exception as e:
+            return {"pages": page_numbers, "detected_type": "Erro", "is_match": False, "confidence": "low", "error": str(e)}
+
+        is_safe, safe_reason = self._audit_negative_results(result_json)
+        return {
+            "pages": page_numbers,
+            "detected_type": result_json.get("detected_type"),
+            "is_match": bool(result_json.get("is_match", False)) and is_safe,
+            "confidence": result_json.get("confidence"),
+            "reasoning": result_json.get("reasoning") if is_safe else safe_reason,
+            "model_deployment": result_json.get("model_deployment")
+        }
+
+    def validate_multi_document(self, file_content: str | bytes, expected_types: list[str], file_name: str = "arquivo.pdf") -> dict:
+        """
+        Modo multi-documento: separa o PDF em grupos de páginas, classifica os grupos em paralelo
+        e verifica se cada tipo esperado aparece em algum deles.
+        """
+        encoded_length = base64_length(file_content or "")
+        if not file_content or encoded_length < 100:
+            return {"status": "error", "message": "Arquivo inválido ou vazio."}
+        if encoded_length * 3 // 4 > (self.MAX_FILE_SIZE_MB * 1024 * 1024):
+            return {"status": "error", "message": f"Arquivo rejeitado: O arquivo excede o limite de {self.MAX_FILE_SIZE_MB}MB."}
+        if estimate_request_memory(encoded_length, 'pdf', MEMORY_COST_FACTORS) > settings.REQUEST_MEMORY_BUDGET_MB * 1024 * 1024:
+            return {"status": "error", "message": "Arquivo rejeitado: O arquivo excede o limite de memória por requisição."}
+
+        file_data = self._decode_content(file_content)
+        if file_data is None:
+            return {"status": "error", "message": "Falha na decodificação do arquivo (Base64 corrompido)."}
+
+        if not file_data.startswith(self.MAGIC_NUMBERS['pdf']):
+            return {"status": "error", "message": "Arquivo rejeitado: O modo multi-documento aceita apenas PDF."}
+
+        segmenter = PdfSegmenter(self._extract_text_cloud, settings.SEGMENT_MAX_PAGES, settings.SEGMENT_MAX_WORKERS)
+        texts, error_flag = segmenter.extract_pages(file_data)
+        del file_data
+        if error_flag:
+            msg_map = {
+                "PDF_PASSWORD_PROTECTED": "PDF protegido por senha.",
+                "PDF_EMPTY_CONTENT": "PDF vazio ou ilegível.",
+                "PDF_CORRUPTED": "PDF corrompido.",
+                "PDF_TOO_MANY_PAGES": f"PDF excede o limite de {settings.SEGMENT_MAX_PAGES} páginas no modo multi-documento."
+            }
+            return {"status": "error", "message": msg_map.get(error_flag, "Erro ao ler PDF.")}
+
+        groups = segmenter.group_pages(texts)
+        with ThreadPoolExecutor(max_workers=settings.SEGMENT_MAX_WORKERS) as executor:
+            segments = list(executor.map(lambda pages: self._classify_segment(pages, texts, expected_types), groups))
+
+        # Grupos vizinhos classificados com o mesmo tipo são o mesmo documento
+        merged = []
+        for segment in segments:
+            if merged and segment["detected_type"] == merged[-1]["detected_type"] and segment["detected_type"] not in ("Ilegível", "Erro"):
+                merged[-1]["pages"].extend(segment["pages"])
+            else:
+                merged.append(segment)
+
+        matches = {}
+        for expected in expected_types:
+            matches[expected] = [
+                segment["pages"] for segment in merged
+                # Sem tipo detectado não há match ("" está contido em qualquer tipo)
+                if segment["is_match"] and segment["detected_type"] and self._types_match(str(segment["detected_type"]), expected)
+            ]
+        missing = [expected for expected, found in matches.items() if not found]
+
+        data = {
+            "detected_type": ", ".join(str(segment["detected_type"]) for segment in merged),
+            "segments": merged,
+            "matches": matches,
+            "missing_types": missing,
+            "method": "azure_llm_segmented",
+            "file_type": "pdf"
+        }
+        if missing:
+            return {"status": "error", "message": f"Documentos não encontrados no PDF: {', '.join(missing)}.", "data": data}
+        return {"status": "success", "message": "Validado com Sucesso", "data": data}
@@ -0,0 +1,298 @@
+import re
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from datetime import datetime, timezone
+import numpy as np
+from app.core.config import settings
+
+# Classe de treino para documentos do tipo certo que o LLM reprovou (sem valores, foto parcial, "Nada Consta"...)
+REJECTED_LABEL = "Reprovado"
+# Exemplos mínimos de cada classe na validação para a calibração ser confiável
+MIN_HOLDOUT_PER_CLASS = 10
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sem acentos, dígitos mascarados (CPF/datas não viram atributo) e espaços colapsados."""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii").lower()
+    text = re.sub(r"\d", "0", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def verdict_label(record: dict) -> str:
+    """
+    Rótulo de treino a partir do veredicto registrado (não só do tipo): aprovado -> detected_type;
+    reprovado no tipo esperado -> REJECTED_LABEL; divergência de tipo (ambíguo) -> None, fica fora.
+    """
+    if not record.get("text") or not record.get("detected_type"):
+        return None
+    if record.get("status") == "success" and record.get("is_match", True):
+        return record["detected_type"]
+    if normalize_text(record["detected_type"]) == normalize_text(record.get("expected_type")):
+        return REJECTED_LABEL
+    return None
+
+
+class HashingFeaturizer:
+    """
+    N-gramas de caracteres com hashing (sem vocabulário): hash polinomial vetorizado em NumPy,
+    contagens com log1p e normalização L2. Saída esparsa (índices, valores).
+    """
+    MAX_CHARS = 20000
+    _PRIME = np.uint64(1099511628211)
+    _MIX = np.uint64(0x9E3779B97F4A7C15)
+
+    def __init__(self, n_features_log2: int = 16, ngram_range: tuple = (3, 5)):
+        self.n_features_log2 = n_features_log2
+        self.n_features = 1 << n_features_log2
+        self.ngram_range = tuple(ngram_range)
+
+    def transform(self, text: str) -> tuple[np.ndarray, np.ndarray]:
+        normalized = f" {normalize_text(text)[:self.MAX_CHARS]} "
+        codes = np.frombuffer(normalized.encode("ascii"), dtype=np.uint8).astype(np.uint64)
+
+        hashes = []
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            count = codes.size - n + 1
+            if count <= 0:
+                continue
+            h = np.full(count, np.uint64(n), dtype=np.uint64)
+            for k in range(n):
+                h = h * self._PRIME + codes[k:k + count]
+            hashes.append(h)
+        if not hashes:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        buckets = (np.concatenate(hashes) * self._MIX) >> np.uint64(64 - self.n_features_log2)
+        indices, counts = np.unique(buckets.astype(np.int64), return_counts=True)
+        values = np.log1p(counts).astype(np.float32)
+        values /= np.linalg.norm(values)
+        return indices, values
+
+    def transform_batch(self, texts: list) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Lote esparso no formato COO: (linhas, colunas, valores)."""
+        rows, cols, vals = [], [], []
+        for row, text in enumerate(texts):
+            indices, values = self.transform(text)
+            rows.append(np.full(indices.size, row, dtype=np.int64))
+            cols.append(indices)
+            vals.append(values)
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _sparse_logits(weights: np.ndarray, bias: np.ndarray, rows, cols, vals, n_rows: int) -> np.ndarray:
+    logits = np.tile(bias, (n_rows, 1))
+    np.add.at(logits, rows, weights[cols] * vals[:, None])
+    return logits
+
+
+class LocalTextClassifier:
+    """
+    Regressão logística multinomial sobre n-gramas com hashing, calibrada por temperatura.
+    Treinada offline com os veredictos registrados (texto extraído -> tipo aprovado ou REJECTED_LABEL).
+    """
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, classes: list, metadata: dict):
+        self.weights = weights
+        self.bias = bias
+        self.classes = list(classes)
+        self.metadata = metadata
+        self.temperature = float(metadata.get("temperature", 1.0))
+        self.featurizer = HashingFeaturizer(metadata["n_features_log2"], tuple(metadata["ngram_range"]))
+
+    @property
+    def version(self) -> str:
+        return self.metadata["version"]
+
+    def predict_proba_batch(self, texts: list) -> np.ndarray:
+        rows, cols, vals = self.featurizer.transform_batch(texts)
+        logits = _sparse_logits(self.weights, self.bias, rows, cols, vals, len(texts))
+        return _softmax(logits / self.temperature)
+
+    def predict_batch(self, texts: list) -> list[dict]:
+        """Pontuação em lote (re-validação de acervos): [{"label", "confidence", "model_version"}]."""
+        if not texts:
+            return []
+        probabilities = self.predict_proba_batch(texts)
+        best = probabilities.argmax(axis=1)
+        return [
+            {"label": self.classes[i], "confidence": round(float(probabilities[row, i]), 4), "model_version": self.version}
+            for row, i in enumerate(best)
+        ]
+
+    def predict(self, text: str) -> dict:
+        return self.predict_batch([text])[0]
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                weights=self.weights,
+                bias=self.bias,
+                classes=np.array(self.classes),
+                metadata=np.array(json.dumps(self.metadata, ensure_ascii=False)),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "LocalTextClassifier":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                weights=data["weights"],
+                bias=data["bias"],
+                classes=[str(c) for c in data["classes"]],
+                metadata=json.loads(str(data["metadata"][()])),
+            )
+
+
+def _fit_temperature(logits: np.ndarray, targets: np.ndarray) -> float:
+    """
+    Temperatura que minimiza a log-verossimilhança negativa na validação (calibração).
+    Nunca abaixo de 1: numa validação separável a NLL cai sempre que a temperatura diminui,
+    o que só deixaria o modelo mais confiante do que os dados permitem.
+    """
+    best_temperature, best_nll = 1.0, float("inf")
+    for temperature in np.geomspace(1.0, 10.0, 50):
+        probabilities = _softmax(logits / temperature)
+        nll = -np.mean(np.log(probabilities[np.arange(len(targets)), targets] + 1e-12))
+        if nll < best_nll:
+            best_temperature, best_nll = float(temperature), nll
+    return round(best_temperature, 2)
+
+
+def train_classifier(texts: list, labels: list, n_features_log2: int = 16, ngram_range: tuple = (3, 5),
+                     epochs: int = 20, learning_rate: float = 0.5, batch_size: int = 64,
+                     holdout_ratio: float = 0.15, seed: int = 0) -> LocalTextClassifier:
+    """
+    Treino offline (SGD em mini-lotes esparsos). Uma fração estratificada de cada classe fica separada
+    para calibração/acurácia; ValueError se alguma classe não tiver MIN_HOLDOUT_PER_CLASS exemplos nela.
+    """
+    featurizer = HashingFeaturizer(n_features_log2, ngram_range)
+    classes = sorted(set(labels))
+    class_index = {label: i for i, label in enumerate(classes)}
+    targets = np.array([class_index[label] for label in labels], dtype=np.int64)
+    features = [featurizer.transform(text) for text in texts]
+
+    rng = np.random.default_rng(seed)
+    holdout_parts, train_parts, short = [], [], []
+    for i in range(len(classes)):
+        members = rng.permutation(np.flatnonzero(targets == i))
+        size = int(len(members) * holdout_ratio)
+        if size < MIN_HOLDOUT_PER_CLASS:
+            short.append(f"{classes[i]} ({len(members)})")
+        holdout_parts.append(members[:size])
+        train_parts.append(members[size:])
+    if short:
+        raise ValueError(f"Exemplos insuficientes para calibrar (mínimo {MIN_HOLDOUT_PER_CLASS} por classe na validação): {', '.join(short)}")
+    holdout, train = np.concatenate(holdout_parts), np.concatenate(train_parts)
+    holdout_size = len(holdout)
+
+    def stack(sample):
+        rows = np.concatenate([np.full(features[i][0].size, row, dtype=np.int64) for row, i in enumerate(sample)])
+        cols = np.concatenate([features[i][0] for i in sample])
+        vals = np.concatenate([features[i][1] for i in sample])
+        return rows, cols, vals
+
+    weights = np.zeros((featurizer.n_features, len(classes)), dtype=np.float32)
+    bias = np.zeros(len(classes), dtype=np.float32)
+    for _ in range(epochs):
+        rng.shuffle(train)
+        for start in range(0, len(train), batch_size):
+            batch = train[start:start + batch_size]
+            rows, cols, vals = stack(batch)
+            gradient = _softmax(_sparse_logits(weights, bias, rows, cols, vals, len(batch)))
+            gradient[np.arange(len(batch)), targets[batch]] -= 1.0
+            gradient /= len(batch)
+            np.subtract.at(weights, cols, learning_rate * vals[:, None] * gradient[rows])
+            bias -= learning_rate * gradient.sum(axis=0)
+
+    rows, cols, vals = stack(holdout)
+    logits = _sparse_logits(weights, bias, rows, cols, vals, holdout_size)
+    temperature = _fit_temperature(logits, targets[holdout])
+    holdout_accuracy = round(float((logits.argmax(axis=1) == targets[holdout]).mean()), 4)
+
+    digest = hashlib.sha256(weights.tobytes() + bias.tobytes()).hexdigest()[:8]
+    trained_at = datetime.now(timezone.utc)
+    metadata = {
+        "version": f"{trained_at.strftime('%Y%m%d%H%M%S')}-{digest}",
+        "trained_at": trained_at.isoformat(),
+        "samples": len(texts),
+        "holdout_size": holdout_size,
+        "holdout_accuracy": holdout_accuracy,
+        "temperature": temperature,
+        "calibrated": True,
+        # Rótulos vêm do veredicto (aprovado/reprovado), condição para o modelo poder dispensar o LLM
+        "label_source": "veredicto",
+        "n_features_log2": n_features_log2,
+        "ngram_range": list(ngram_range),
+    }
+    return LocalTextClassifier(weights, bias, classes, metadata)
+
+
+class VerdictLog:
+    """
+    Registro (JSONL) dos veredictos do LLM com o texto extraído normalizado, base do treino offline.
+    O texto é gravado com dígitos mascarados; ainda assim contém dados pessoais: só ativar com armazenamento adequado.
+    """
+    MAX_TEXT_CHARS = 5000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, extracted_text: str, expected_type: str, detected_type: str, status: str, is_match: bool, model: str = None):
+        record = {
+            "ts": round(time.time(), 3),
+            "text": normalize_text(extracted_text)[:self.MAX_TEXT_CHARS],
+            "expected_type": expected_type,
+            "detected_type": detected_type,
+            "status": status,
+            "is_match": is_match,
+            "model": model,
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    @staticmethod
+    def read(path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class _LazyLocalClassifier:
+    """Carrega o modelo de LOCAL_CLASSIFIER_MODEL_PATH só no primeiro uso (uma vez por processo)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._model = None
+
+    def get(self) -> LocalTextClassifier:
+        if not settings.LOCAL_CLASSIFIER_MODEL_PATH:
+            return None
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        self._model = LocalTextClassifier.load(settings.LOCAL_CLASSIFIER_MODEL_PATH)
+                    except Exception as e:
+                        print(f"Aviso classificador local: {e}")
+                    self._loaded = True
+        return self._model
+
+
+local_classifier = _LazyLocalClassifier()
+verdict_log = VerdictLog(settings.VERDICT_LOG_PATH) if settings.VERDICT_LOG_PATH else None
@@ -0,0 +1,66 @@
+import threading
+from app.core.config import settings
+from app.core.constants import MODEL_ROUTING, VALID_DOCUMENTS
+
+
+class CascadeMetrics:
+    """
+    Contadores por instância da cascata de modelos (taxa de escalonamento por tipo e motivo).
+    expected_type vem do cliente: só tipos da lista oficial (e o modo multi-documento) têm contador
+    próprio, o resto cai em "Outros" (o dicionário não cresce sem limite).
+    """
+    MULTI_DOCUMENT_KEY = "Multi-documento"
+    KNOWN_TYPES = frozenset(VALID_DOCUMENTS) | {MULTI_DOCUMENT_KEY}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_type = {}
+
+    def record(self, expected_type: str, route: str, escalation_reason: str = None):
+        key = expected_type if expected_type in self.KNOWN_TYPES else "Outros"
+        with self._lock:
+            stats = self._by_type.setdefault(key, {"strong_only": 0, "cascade": 0, "escalated": 0, "reasons": {}})
+            if route != "cascade":
+                stats["strong_only"] += 1
+                return
+            stats["cascade"] += 1
+            if escalation_reason:
+                stats["escalated"] += 1
+                stats["reasons"][escalation_reason] = stats["reasons"].get(escalation_reason, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snapshot = {}
+            for doc_type, stats in self._by_type.items():
+                rate = stats["escalated"] / stats["cascade"] if stats["cascade"] else 0.0
+                snapshot[doc_type] = {**stats, "reasons": dict(stats["reasons"]), "escalation_rate": round(rate, 3)}
+            return snapshot
+
+
+class ModelCascade:
+    """
+    Roteamento de modelos: tipos em modo 'cascade' vão primeiro ao deployment rápido
+    (AZURE_OPENAI_FAST_DEPLOYMENT) e só sobem para o GPT-4o quando a resposta não é confiável.
+    """
+
+    def route_for(self, expected_type) -> str:
+        """
+        'cascade' ou 'strong'. Sem deployment rápido configurado, tudo vai direto ao modelo forte.
+        Lista de tipos (modo multi-documento): 'strong' se qualquer um deles for 'strong'.
+        """
+        if not settings.AZURE_OPENAI_FAST_DEPLOYMENT:
+            return "strong"
+        expected_types = expected_type if isinstance(expected_type, list) else [expected_type]
+        routes = {MODEL_ROUTING.get(t, MODEL_ROUTING["default"]) for t in expected_types}
+        return "strong" if "strong" in routes else "cascade"
+
+    def escalation_reason(self, result_json: dict, type_matches: bool) -> str:
+        """Motivo para escalonar a resposta do modelo rápido (None se ela pode ser usada)."""
+        if str(result_json.get("confidence", "")).strip().lower() != "high":
+            return "confianca_nao_alta"
+        if bool(result_json.get("is_match", False)) != type_matches:
+            return "divergencia_tipo"
+        return None
+
+
+cascade_metrics = CascadeMetrics()
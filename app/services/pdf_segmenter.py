@@ -0,0 +1,98 @@
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pypdf import PdfReader
+
+
+class PdfSegmenter:
+    """
+    Separa um PDF com vários documentos (ex: RG + CPF + Comprovante num arquivo só) em grupos de páginas.
+    Páginas consecutivas com vocabulário parecido (mesmo modelo/continuação) ficam no mesmo grupo.
+    """
+    # Similaridade mínima (Jaccard das palavras) para considerar a página continuação da anterior
+    CONTINUATION_SIMILARITY = 0.3
+
+    def __init__(self, ocr_fn, max_pages: int, max_workers: int):
+        self.ocr_fn = ocr_fn
+        self.max_pages = max_pages
+        self.max_workers = max_workers
+
+    @staticmethod
+    def _read_page(page, number: int) -> tuple[str, list[bytes]]:
+        """
+        Texto nativo e bytes das imagens embutidas de uma página. Roda em sequência: os objetos
+        do pypdf são carregados sob demanda do mesmo stream (seek/read), que não pode ser compartilhado entre threads.
+        """
+        text, images = "", []
+        try:
+            text = page.extract_text() or ""
+        except Exception as e:
+            print(f"Aviso PDF (página {number + 1}, texto): {e}")
+        try:
+            images = [image.data for image in page.images]
+        except Exception as e:
+            print(f"Aviso PDF (página {number + 1}, imagens): {e}")
+        return text, images
+
+    def extract_pages(self, file_bytes: bytes) -> tuple[list[str], str]:
+        """Retorna (texto por página, flag_de_erro). Leitura do PDF em sequência; só o OCR roda em paralelo."""
+        try:
+            reader = PdfReader(io.BytesIO(file_bytes))
+            if reader.is_encrypted:
+                try:
+                    reader.decrypt("")
+                except Exception:
+                    return [], "PDF_PASSWORD_PROTECTED"
+
+            pages = list(reader.pages)
+            if len(pages) > self.max_pages:
+                return [], "PDF_TOO_MANY_PAGES"
+
+            parts = []
+            ocr_jobs = []  # (índice da página, bytes da imagem)
+            for number, page in enumerate(pages):
+                text, images = self._read_page(page, number)
+                parts.append([text] if text else [])
+                ocr_jobs.extend((number, data) for data in images)
+        except Exception as e:
+            if "password" in str(e).lower():
+                return [], "PDF_PASSWORD_PROTECTED"
+            print(f"Erro PDF Genérico: {e}")
+            return [], "PDF_CORRUPTED"
+
+        # Páginas escaneadas: as chamadas de OCR (rede) são independentes e vão em paralelo
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            ocr_texts = list(executor.map(lambda job: self.ocr_fn(job[1]), ocr_jobs))
+        for (number, _), ocr_text in zip(ocr_jobs, ocr_texts):
+            if ocr_text:
+                parts[number].append(f"[CONTEÚDO DE IMAGEM OCR]: {ocr_text}")
+        del ocr_jobs
+
+        texts = ["\n".join(page_parts) for page_parts in parts]
+        if not any(text.strip() for text in texts):
+            return [], "PDF_EMPTY_CONTENT"
+        return texts, None
+
+    @staticmethod
+    def _words(text: str) -> set:
+        return {w for w in re.split(r"\W+", text.lower()) if len(w) >= 4}
+
+    def group_pages(self, texts: list[str]) -> list[list[int]]:
+        """Agrupa índices de páginas (base 0). Páginas sem texto acompanham a anterior."""
+        groups = []
+        previous_words = None
+        for index, text in enumerate(texts):
+            words = self._words(text)
+            if groups and (not words or previous_words is None or self._similarity(words, previous_words) >= self.CONTINUATION_SIMILARITY):
+                groups[-1].append(index)
+            else:
+                groups.append([index])
+            if words:
+                previous_words = words
+        return groups
+
+    @staticmethod
+    def _similarity(a: set, b: set) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
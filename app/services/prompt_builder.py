@@ -1,11 +1,65 @@
 import json
-from app.core.constants import VALID_DOCUMENTS
+from app.core.constants import VALID_DOCUMENTS, EXTRA_DETECTED_TYPES
 
 class PromptBuilder:
+    # Rótulos que o modelo pode devolver em detected_type (enum do modo compacto)
+    DETECTED_TYPES = VALID_DOCUMENTS + EXTRA_DETECTED_TYPES
+
+    @staticmethod
+    def _output_instruction(compact: bool) -> str:
+        if compact:
+            return """
+        Responda APENAS com um JSON contendo exatamente estas chaves:
+        - "keywords": até 5 palavras-chave exatas encontradas no documento.
+        - "detected_type": uma das categorias permitidas ('Aviso de Inexistência' se cair na regra 4 de rejeição).
+        - "is_match": true se detected_type atender à expectativa do usuário, seguindo as regras acima.
+        - "confidence": "high", "medium" ou "low".
+        - "reasoning": no máximo 15 palavras; null se confidence for "high" e is_match for true. Se rejeitar por 'Nada Consta', cite a frase de ausência.
+        """
+        return """
+        Responda APENAS neste formato JSON:
+        {
+            "step_1_keywords": "Cite as palavras-chave exatas encontradas (ex: 'Líquido a Receber', 'Aplicação Automática', 'Extrato da Conta Bancária')",
+            "detected_type": "Nome da Categoria Detectada (Ou 'Aviso de Inexistência' se cair na regra 4 de rejeição)",
+            "is_match": true/false (true se detected_type atender à expectativa do usuário, seguindo as regras acima),
+            "confidence": "high/medium/low",
+            "reasoning": "Explique sua decisão. Se rejeitar por 'Nada Consta', cite a frase de ausência encontrada."
+        }
+        """
+
     @staticmethod
-    def build_verification_prompt(expected_type: str) -> str:
+    def build_response_format(compact: bool) -> dict:
+        """
+        Formato de resposta da OpenAI. O modo compacto usa Structured Outputs (JSON Schema estrito),
+        o que elimina JSON malformado e limita detected_type às categorias conhecidas.
+        """
+        if not compact:
+            return {"type": "json_object"}
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "document_classification",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "keywords": {"type": "array", "items": {"type": "string"}},
+                        "detected_type": {"type": "string", "enum": PromptBuilder.DETECTED_TYPES},
+                        "is_match": {"type": "boolean"},
+                        "confidence": {"type": "string", "enum": ["high", "medium", "low"]},
+                        "reasoning": {"type": ["string", "null"]}
+                    },
+                    "required": ["keywords", "detected_type", "is_match", "confidence", "reasoning"],
+                    "additionalProperties": False
+                }
+            }
+        }
+
+    @staticmethod
+    def build_verification_prompt(expected_type: str, compact: bool = False) -> str:
         """
         Constrói um prompt detalhado para a Azure OpenAI, focado em regras de negócio brasileiras.
+        compact=True pede a resposta curta (Structured Outputs); o verboso fica para auditoria/debug.
         """
         
         docs_list = json.dumps(VALID_DOCUMENTS, ensure_ascii=False)
@@ -88,13 +142,4 @@ class PromptBuilder:
 
         --- INSTRUÇÃO DE SAÍDA ---
         O texto fornecido foi extraído via OCR e pode conter formatação quebrada. Foque no contexto semântico.
-
-        Responda APENAS neste formato JSON:
-        {{
-            "step_1_keywords": "Cite as palavras-chave exatas encontradas (ex: 'Líquido a Receber', 'Aplicação Automática', 'Extrato da Conta Bancária')",
-            "detected_type": "Nome da Categoria Detectada (Ou 'Aviso de Inexistência' se cair na regra 4 de rejeição)",
-            "is_match": true/false (true se detected_type atender à expectativa do usuário, seguindo as regras acima),
-            "confidence": "high/medium/low",
-            "reasoning": "Explique sua decisão. Se rejeitar por 'Nada Consta', cite a frase de ausência encontrada."
-        }}
-        """
\ No newline at end of file
+        {PromptBuilder._output_instruction(compact)}"""
\ No newline at end of file
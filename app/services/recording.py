@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from types import SimpleNamespace
+from app.core.exceptions import CassetteMissError
+
+
+class CassetteStore:
+    """
+    Armazena respostas reais de OCR/LLM em disco (um JSON por requisição, chave = hash do pedido).
+    Permite reproduzir o pipeline completo offline, de forma determinística.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(kind: str, payload) -> str:
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            digest = hashlib.sha256(bytes(payload)).hexdigest()
+        else:
+            digest = hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+        return f"{kind}_{digest}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key: str) -> dict:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise CassetteMissError(f"Resposta gravada não encontrada: {key}")
+
+    def save(self, key: str, cassette: dict):
+        # Escrita atômica: requisições concorrentes nunca leem um arquivo pela metade
+        tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cassette, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._path(key))
+
+
+class _TransportStats:
+    """Contadores por instância (latência e tokens) para comparar execuções de replay."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.latency_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add(self, latency: float, usage: dict = None):
+        with self._lock:
+            self.calls += 1
+            self.latency_seconds += latency
+            if usage:
+                self.prompt_tokens += usage.get("prompt_tokens", 0) or 0
+                self.completion_tokens += usage.get("completion_tokens", 0) or 0
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "latency_seconds": round(self.latency_seconds, 3),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+
+
+class RecordingLLMClient:
+    """
+    Transporte plugável com a mesma interface usada de AzureOpenAI (chat.completions.create).
+    mode='record': chama o cliente real e grava a resposta; mode='replay': responde do disco.
+    """
+
+    def __init__(self, real_client, store: CassetteStore, mode: str, latency_scale: float = 1.0):
+        self.real_client = real_client
+        self.store = store
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.stats = _TransportStats()
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        key = self.store.make_key("llm", kwargs)
+
+        if self.mode == "replay":
+            cassette = self.store.load(key)
+            time.sleep(cassette["latency_seconds"] * self.latency_scale)
+            self.stats.add(cassette["latency_seconds"] * self.latency_scale, cassette.get("usage"))
+            return SimpleNamespace(
+                model=cassette.get("model"),
+                choices=[SimpleNamespace(message=SimpleNamespace(content=cassette["content"]), finish_reason=cassette.get("finish_reason"))],
+                usage=SimpleNamespace(**cassette["usage"]) if cassette.get("usage") else None,
+            )
+
+        started = time.perf_counter()
+        response = self.real_client.chat.completions.create(**kwargs)
+        latency = time.perf_counter() - started
+
+        usage = None
+        if getattr(response, "usage", None) is not None:
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens,
+            }
+        self.stats.add(latency, usage)
+        self.store.save(key, {
+            "model": getattr(response, "model", kwargs.get("model")),
+            "content": response.choices[0].message.content,
+            "finish_reason": getattr(response.choices[0], "finish_reason", None),
+            "usage": usage,
+            "latency_seconds": round(latency, 4),
+        })
+        return response
+
+
+class RecordingOCRClient:
+    """Mesmo esquema para o Azure Vision (analyze): grava linhas, polígonos e latência."""
+
+    def __init__(self, real_client, store: CassetteStore, mode: str, latency_scale: float = 1.0):
+        self.real_client = real_client
+        self.store = store
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.stats = _TransportStats()
+
+    @staticmethod
+    def _to_namespace(blocks: list):
+        if blocks is None:
+            return SimpleNamespace(read=None)
+        return SimpleNamespace(read=SimpleNamespace(blocks=[
+            SimpleNamespace(lines=[
+                SimpleNamespace(
+                    text=line["text"],
+                    bounding_polygon=[SimpleNamespace(x=x, y=y) for x, y in line.get("bounding_polygon", [])]
+                )
+                for line in block["lines"]
+            ])
+            for block in blocks
+        ]))
+
+    def analyze(self, image_data, visual_features, **kwargs):
+        key = self.store.make_key("ocr", image_data)
+
+        if self.mode == "replay":
+            cassette = self.store.load(key)
+            time.sleep(cassette["latency_seconds"] * self.latency_scale)
+            self.stats.add(cassette["latency_seconds"] * self.latency_scale)
+            return self._to_namespace(cassette["blocks"])
+
+        started = time.perf_counter()
+        result = self.real_client.analyze(image_data=image_data, visual_features=visual_features, **kwargs)
+        latency = time.perf_counter() - started
+
+        blocks = None
+        if result.read:
+            blocks = [
+                {"lines": [
+                    {"text": line.text, "bounding_polygon": [[p.x, p.y] for p in (getattr(line, "bounding_polygon", None) or [])]}
+                    for line in block.lines
+                ]}
+                for block in result.read.blocks
+            ]
+        self.stats.add(latency)
+        self.store.save(key, {"blocks": blocks, "latency_seconds": round(latency, 4)})
+        return result
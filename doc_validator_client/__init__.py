@@ -0,0 +1,13 @@
+"""
+Cliente Python da API de validação de documentos.
+
+Exemplo:
+    from doc_validator_client import DocValidatorClient
+
+    with DocValidatorClient("https://minha-function.azurewebsites.net", function_key="...") as client:
+        resultado = client.validate("rg.jpg", "RG")
+        lote = client.validate_many([("holerite.pdf", "Holerite"), ("rg.jpg", "RG")])
+"""
+from doc_validator_client.client import DocValidatorClient, AsyncDocValidatorClient, DocValidatorError
+
+__all__ = ["DocValidatorClient", "AsyncDocValidatorClient", "DocValidatorError"]
@@ -0,0 +1,224 @@
+import os
+import time
+import uuid
+import base64
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional, Union
+import requests
+from requests.adapters import HTTPAdapter
+
+FileInput = Union[str, bytes, os.PathLike]
+
+
+class DocValidatorError(Exception):
+    """Exceção levantada quando a API não responde com sucesso após todas as tentativas."""
+    def __init__(self, message: str, status_code: int = None, response: dict = None):
+        self.message = message
+        self.status_code = status_code
+        self.response = response
+        super().__init__(self.message)
+
+
+class DocValidatorClient:
+    """
+    Cliente da API validate_document para integradores e jobs em lote.
+
+    - Sessão HTTP persistente com pool de conexões (keep-alive) e respostas gzip.
+    - Upload binário (application/octet-stream) quando o servidor suporta; senão JSON com Base64.
+    - Retry com backoff exponencial, respeitando 429/Retry-After.
+    - Cada documento leva uma Idempotency-Key: retries não geram nova validação no servidor.
+    """
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    # Resposta de servidores sem upload binário ao receberem application/octet-stream
+    JSON_REQUIRED_MESSAGE = "não é um JSON válido"
+
+    def __init__(
+        self,
+        base_url: str,
+        function_key: str = None,
+        timeout: float = 90.0,
+        max_retries: int = 3,
+        max_concurrency: int = 8,
+        upload_mode: str = "auto",
+    ):
+        """upload_mode: 'auto' (binário com fallback para JSON), 'binary' ou 'json'."""
+        if upload_mode not in ("auto", "binary", "json"):
+            raise ValueError("upload_mode deve ser 'auto', 'binary' ou 'json'.")
+
+        self.url = base_url.rstrip("/") + "/api/validate_document"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self._binary_supported = {"auto": None, "binary": True, "json": False}[upload_mode]
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        # Pool do tamanho da concorrência: cada worker reaproveita sua conexão (keep-alive)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip, deflate"})
+        if function_key:
+            self.session.headers["x-functions-key"] = function_key
+
+    # --- Ciclo de vida ---
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Envio ---
+    def _read_file(self, file: FileInput, file_name: Optional[str]) -> tuple[bytes, str]:
+        if isinstance(file, (bytes, bytearray, memoryview)):
+            return bytes(file), file_name or "arquivo.jpg"
+        with open(file, "rb") as f:
+            return f.read(), file_name or os.path.basename(str(file))
+
+    def _send(self, file_bytes: bytes, expected_type, file_name: str, idempotency_key: str) -> requests.Response:
+        headers = {"Idempotency-Key": idempotency_key}
+        # Lista de tipos = modo multi-documento (PDF com vários documentos)
+        type_field = "expected_types" if isinstance(expected_type, (list, tuple)) else "expected_type"
+        if type_field == "expected_types":
+            expected_type = list(expected_type)
+
+        if self._binary_supported is not False:
+            response = self.session.post(
+                self.url,
+                data=file_bytes,
+                params={type_field: ",".join(expected_type) if type_field == "expected_types" else expected_type, "file_name": file_name},
+                headers={**headers, "Content-Type": "application/octet-stream"},
+                timeout=self.timeout,
+            )
+            # Servidores antigos só aceitam JSON; outros 400 (tipo faltando etc.) não mudam o modo de envio
+            if self._binary_supported is None and self._rejects_binary(response):
+                with self._lock:
+                    self._binary_supported = False
+            else:
+                if self._binary_supported is None and response.status_code < 500:
+                    with self._lock:
+                        self._binary_supported = True
+                return response
+
+        payload = {
+            type_field: expected_type,
+            "file_base64": base64.b64encode(file_bytes).decode("ascii"),
+            "file_name": file_name,
+        }
+        return self.session.post(self.url, json=payload, headers=headers, timeout=self.timeout)
+
+    @classmethod
+    def _rejects_binary(cls, response: requests.Response) -> bool:
+        """415, ou o 400 de servidor antigo que tentou ler o corpo binário como JSON."""
+        if response.status_code == 415:
+            return True
+        if response.status_code != 400:
+            return False
+        body = cls._safe_json(response) or {}
+        return cls.JSON_REQUIRED_MESSAGE in str(body.get("message", ""))
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        if response is not None and response.headers.get("Retry-After"):
+            try:
+                return float(response.headers["Retry-After"])
+            except ValueError:
+                pass
+        # Backoff exponencial com jitter (evita tempestade de retries sincronizados)
+        return min(30.0, (2 ** attempt) * 0.5) * (0.5 + random.random())
+
+    def validate(self, file: FileInput, expected_type, file_name: str = None) -> dict:
+        """
+        Valida um documento (caminho ou bytes) e retorna o JSON da API.
+        expected_type pode ser uma lista de tipos para PDFs com vários documentos.
+        """
+        file_bytes, file_name = self._read_file(file, file_name)
+        idempotency_key = str(uuid.uuid4())
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = self._send(file_bytes, expected_type, file_name, idempotency_key)
+                if response.status_code not in self.RETRY_STATUS:
+                    if response.status_code >= 400:
+                        raise DocValidatorError(
+                            f"Requisição rejeitada ({response.status_code}).",
+                            status_code=response.status_code,
+                            response=self._safe_json(response),
+                        )
+                    return response.json()
+                last_error = DocValidatorError(
+                    f"Falha temporária ({response.status_code}).",
+                    status_code=response.status_code,
+                    response=self._safe_json(response),
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = DocValidatorError(f"Erro de conexão: {e}")
+
+            if attempt < self.max_retries:
+                time.sleep(self._retry_delay(attempt, response))
+
+        raise last_error
+
+    def validate_many(self, documents: Iterable[tuple], return_exceptions: bool = True) -> list:
+        """
+        Valida vários documentos com concorrência limitada (max_concurrency).
+        documents: iterável de (arquivo, expected_type) ou (arquivo, expected_type, file_name).
+        Resultados na mesma ordem da entrada; falhas viram DocValidatorError se return_exceptions.
+        """
+        def run(document):
+            try:
+                return self.validate(*document)
+            except DocValidatorError as e:
+                if return_exceptions:
+                    return e
+                raise
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            return list(executor.map(run, documents))
+
+    @staticmethod
+    def _safe_json(response: requests.Response) -> Optional[dict]:
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+
+class AsyncDocValidatorClient:
+    """
+    Interface assíncrona (asyncio) sobre o mesmo cliente com pool.
+    As chamadas HTTP rodam em threads; a concorrência é limitada por um semáforo.
+    """
+
+    def __init__(self, base_url: str, **kwargs):
+        self._client = DocValidatorClient(base_url, **kwargs)
+        self._semaphore = None  # Criado dentro do event loop em uso
+        self._executor = ThreadPoolExecutor(max_workers=self._client.max_concurrency)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+        self._client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def validate(self, file: FileInput, expected_type: str, file_name: str = None) -> dict:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._client.max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._client.validate, file, expected_type, file_name)
+
+    async def validate_many(self, documents: Iterable[tuple], return_exceptions: bool = True) -> list:
+        tasks = [self.validate(*document) for document in documents]
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
@@ -1,36 +1,114 @@
 import azure.functions as func
 import logging
 import json
-# import base64  <-- Não precisa mais, já vem pronto do front
+# import base64  <-- Não precisa mais, já vem pronto do front (ou cru no upload binário)
+import re
+from app.core.config import settings
+from app.core.memory import track_peak_memory, base64_length
+from app.core.admission import admission_controller
+from app.core.single_flight import request_coalescer
+from app.core.rate_limit import tenant_limiter, estimate_request_tokens
+from app.core.exceptions import OverloadedError, IdempotencyConflictError
 from app.services.llm_service import DocumentAnalyzerService
+from app.services.model_cascade import cascade_metrics
 
 app = func.FunctionApp()
 
+
+def _identify_tenant(req: func.HttpRequest) -> str:
+    """
+    Cliente da requisição pela chave de API cadastrada em TENANT_API_KEYS. Sem chave ou com chave
+    desconhecida, todos dividem o mesmo balde "anonimo" (trocar de chave/header não contorna o limite).
+    X-Tenant-Id só vale junto de uma chave cadastrada e vira subcliente ("cliente/sub"), que também
+    consome o limite do cliente. Sem nenhuma chave cadastrada o tenant_limiter fica desligado.
+    """
+    tenant = settings.TENANT_API_KEYS.get(req.headers.get("x-api-key", ""))
+    if not tenant:
+        return "anonimo"
+    sub_tenant = re.sub(r"[^\w.-]", "", req.headers.get("X-Tenant-Id", ""))[:64]
+    return f"{tenant}/{sub_tenant}" if sub_tenant else tenant
+
+
+def _run_validation(file_content: str | bytes, expected_type, file_name: str, response_mode: str = None, tenant: str = "anonimo") -> dict:
+    """
+    Executa a validação sob o limite de tokens do cliente e o controle de admissão
+    (levanta OverloadedError/TenantRateLimitError se saturado).
+    expected_type em lista ativa o modo multi-documento (PDF segmentado por páginas).
+    """
+    is_multi = isinstance(expected_type, list)
+    estimated_tokens = estimate_request_tokens(base64_length(file_content), file_name, is_multi)
+    tenant_limiter.reserve_tokens(tenant, estimated_tokens)
+
+    service = None
+    request_cost = admission_controller.estimate_cost(base64_length(file_content), file_name)
+    try:
+        with admission_controller.admit(request_cost):
+            service = DocumentAnalyzerService()
+
+            if is_multi:
+                return service.validate_multi_document(file_content, expected_type, file_name)
+
+            # Passamos direto o conteúdo recebido (Base64 do front ou bytes do upload binário)
+            if settings.MEMORY_TRACKING_ENABLED:
+                with track_peak_memory() as memory_usage:
+                    result = service.validate_document(file_content, expected_type, file_name, response_mode, tenant)
+                logging.info(f"Pico de memória: {memory_usage['peak_mb']} MB | Arquivo: {file_name}")
+                return result
+            return service.validate_document(file_content, expected_type, file_name, response_mode, tenant)
+    except OverloadedError as e:
+        logging.warning(f"Requisição descartada (custo {request_cost:.1f}): {e.message} | {admission_controller.metrics()}")
+        raise
+    finally:
+        # Concilia a estimativa com o consumo real (sem chamada ao LLM, a reserva é devolvida)
+        tenant_limiter.reconcile(tenant, estimated_tokens, service.llm_usage if service else None)
+
+
 @app.function_name(name="validate_document")
 @app.route(route="validate_document", auth_level=func.AuthLevel.ANONYMOUS, methods=['POST'])
 def validate_document(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Requisição recebida: Processando JSON do Streamlit.')
 
     try:
-        # 1. Tenta pegar o JSON (Já que o Streamlit manda json=payload)
-        try:
-            req_body = req.get_json()
-        except ValueError:
-             return func.HttpResponse(
-                json.dumps({"result": "NOK", "message": "O corpo da requisição não é um JSON válido."}),
-                status_code=400,
-                mimetype="application/json"
-            )
+        # 1. Upload binário (SDK/integradores): arquivo cru no corpo, metadados na query string.
+        # Evita os ~33% extras do Base64 no tráfego e o parse de um JSON gigante; os bytes seguem crus até o serviço.
+        content_type = req.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type == "application/octet-stream":
+            req_body = {
+                "file_bytes": req.get_body() or None,
+                "expected_type": req.params.get("expected_type"),
+                "expected_types": req.params.get("expected_types"),
+                "file_name": req.params.get("file_name", "arquivo_sem_nome"),
+                "response_mode": req.params.get("response_mode")
+            }
+        else:
+            # Tenta pegar o JSON (Já que o Streamlit manda json=payload)
+            try:
+                req_body = req.get_json()
+            except ValueError:
+                 return func.HttpResponse(
+                    json.dumps({"result": "NOK", "message": "O corpo da requisição não é um JSON válido."}),
+                    status_code=400,
+                    mimetype="application/json"
+                )
 
         # 2. Extrai os dados usando as CHAVES EXATAS do seu main.py
         # No main.py você usou: "file_base64", "expected_type", "file_name"
         #base64_string = req_body.get('file_base64')
-        base64_string = req_body.get('file_base64') or req_body.get('image_base64')
+        # Upload binário traz os bytes; JSON traz o Base64 (o serviço aceita os dois)
+        file_content = req_body.get('file_bytes') or req_body.get('file_base64') or req_body.get('image_base64')
         expected_type = req_body.get('expected_type')
+        # Modo multi-documento: "expected_types": ["RG", "CPF", ...] num PDF só
+        expected_types = req_body.get('expected_types')
+        if isinstance(expected_types, str):
+            expected_types = [t.strip() for t in expected_types.split(",") if t.strip()]
+        if expected_types:
+            expected_type = expected_types
         file_name = req_body.get('file_name', 'arquivo_sem_nome')
+        # "verbose" pede o raciocínio completo do modelo (auditoria/debug); padrão é o modo compacto
+        response_mode = req_body.get('response_mode')
 
         # Validação Básica
-        if not base64_string or not expected_type:
+        if not file_content or not expected_type:
             return func.HttpResponse(
                 json.dumps({
                     "result": "NOK", 
@@ -40,14 +118,38 @@ def validate_document(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
 
-        logging.info(f"Processando arquivo: {file_name} | Tipo esperado: {expected_type}")
+        tenant = _identify_tenant(req)
+        logging.info(f"Processando arquivo: {file_name} | Tipo esperado: {expected_type} | Cliente: {tenant}")
 
-        # 3. Execução do Serviço
+        # 3. Execução do Serviço (com controle de admissão: sobrecarga responde 429 rápido)
         # Note que removi a conversão de binário para base64, pois já recebemos a string pronta!
-        service = DocumentAnalyzerService()
-        
-        # Passamos direto a string que veio do front
-        result = service.validate_document(base64_string, expected_type, file_name)
+        # Requisições idênticas em andamento (retry/duplo clique) compartilham uma única validação
+        type_key = "|".join(expected_type) if isinstance(expected_type, list) else expected_type
+        fingerprint = request_coalescer.fingerprint(file_content, f"{type_key}|{response_mode or ''}", str(file_name).split('.')[-1])
+        flight_key = request_coalescer.build_key(fingerprint, req.headers.get("Idempotency-Key"), tenant)
+        try:
+            # Orçamento de requisições do cliente; tokens só são reservados por quem executa de fato
+            tenant_limiter.acquire_request(tenant)
+            result, coalesced = request_coalescer.run(
+                flight_key,
+                fingerprint,
+                lambda: _run_validation(file_content, expected_type, file_name, response_mode, tenant),
+                # Erros internos (ex: falha na OpenAI) não são reaproveitados na janela de replay
+                cacheable=lambda r: not str(r.get("message", "")).startswith("Erro Interno")
+            )
+        except IdempotencyConflictError as e:
+            return func.HttpResponse(
+                json.dumps({"result": "NOK", "message": str(e)}),
+                status_code=422,
+                mimetype="application/json"
+            )
+        except OverloadedError as e:
+            return func.HttpResponse(
+                json.dumps({"result": "NOK", "message": e.message}),
+                status_code=429,
+                headers={"Retry-After": str(e.retry_after)},
+                mimetype="application/json"
+            )
         
         # 4. Montagem da Resposta
         is_success = result["status"] == "success"
@@ -58,12 +160,14 @@ def validate_document(req: func.HttpRequest) -> func.HttpResponse:
             "message": result.get("message"),
             "detected_type": data_content.get("detected_type", "Não identificado"),
             "file_processed": file_name,
+            "reused_verdict": data_content.get("reused_verdict", False),
             "details": data_content
         }
 
         return func.HttpResponse(
             json.dumps(response_payload),
             status_code=200, 
+            headers={"X-Request-Coalesced": "true" if coalesced else "false"},
             mimetype="application/json"
         )
 
@@ -73,4 +177,20 @@ def validate_document(req: func.HttpRequest) -> func.HttpResponse:
             json.dumps({"result": "NOK", "message": "Erro interno no Backend.", "error": str(e)}),
             status_code=500,
             mimetype="application/json"
-        )
\ No newline at end of file
+        )
+
+
+@app.function_name(name="metrics")
+@app.route(route="metrics", auth_level=func.AuthLevel.FUNCTION, methods=['GET'])
+def metrics(req: func.HttpRequest) -> func.HttpResponse:
+    """Métricas da instância (fila, descarte, custo em processamento, consumo por cliente)."""
+    return func.HttpResponse(
+        json.dumps({
+            "admission": admission_controller.metrics(),
+            "single_flight": request_coalescer.metrics(),
+            "model_cascade": cascade_metrics.snapshot(),
+            "tenants": tenant_limiter.metrics()
+        }),
+        status_code=200,
+        mimetype="application/json"
+    )
@@ -0,0 +1,93 @@
+"""
+Treina (offline) e avalia o classificador local a partir do registro de veredictos (VERDICT_LOG_PATH).
+
+Uso:
+    # Treina com os veredictos registrados e salva um modelo versionado
+    python testes/classificador_local.py treinar veredictos.jsonl --saida modelos/classificador.npz
+    # Pontua em lote um acervo (JSONL com "text" e, opcionalmente, o veredicto para medir acerto)
+    python testes/classificador_local.py pontuar modelos/classificador.npz acervo.jsonl --resultado pontuado.jsonl
+
+O modelo aprende o veredicto, não só o tipo: documentos aprovados viram o próprio tipo e documentos
+do tipo esperado reprovados pelo LLM viram a classe "Reprovado" (divergências de tipo ficam de fora).
+O modelo é ativado no app com LOCAL_CLASSIFIER_MODEL_PATH=modelos/classificador.npz.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# O app exige as credenciais na importação das configurações; o treino/pontuação não usa o Azure
+for name in ("AZURE_OPENAI_KEY", "AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_DEPLOYMENT", "AZURE_OPENAI_API_VERSION", "AZURE_CV_KEY", "AZURE_CV_ENDPOINT"):
+    os.environ.setdefault(name, "offline")
+
+from app.services.local_classifier import LocalTextClassifier, VerdictLog, train_classifier, verdict_label
+
+parser = argparse.ArgumentParser(description="Classificador local de documentos (treino e pontuação em lote).")
+subparsers = parser.add_subparsers(dest="comando", required=True)
+
+treinar = subparsers.add_parser("treinar", help="Treina a partir do JSONL de veredictos")
+treinar.add_argument("veredictos")
+treinar.add_argument("--saida", required=True, help="Arquivo .npz do modelo")
+treinar.add_argument("--min-exemplos", type=int, default=70, help="Classes com menos exemplos ficam de fora (a validação precisa de 10 por classe)")
+treinar.add_argument("--epocas", type=int, default=20)
+treinar.add_argument("--bits", type=int, default=16, help="log2 do número de atributos (hashing)")
+
+pontuar = subparsers.add_parser("pontuar", help="Pontua em lote um acervo JSONL")
+pontuar.add_argument("modelo")
+pontuar.add_argument("acervo")
+pontuar.add_argument("--lote", type=int, default=512)
+pontuar.add_argument("--resultado", help="JSONL de saída com a previsão de cada documento")
+args = parser.parse_args()
+
+if args.comando == "treinar":
+    labeled = [(r["text"], verdict_label(r)) for r in VerdictLog.read(args.veredictos)]
+    labeled = [(text, label) for text, label in labeled if label]
+    counts = Counter(label for _, label in labeled)
+    labeled = [(text, label) for text, label in labeled if counts[label] >= args.min_exemplos]
+    if len({label for _, label in labeled}) < 2:
+        sys.exit("Menos de duas classes com exemplos suficientes para treinar.")
+
+    started = time.perf_counter()
+    try:
+        model = train_classifier([text for text, _ in labeled], [label for _, label in labeled],
+                                 n_features_log2=args.bits, epochs=args.epocas)
+    except ValueError as e:
+        sys.exit(str(e))
+    model.save(args.saida)
+    print(f"Modelo {model.version} salvo em {args.saida} ({time.perf_counter() - started:.1f}s)")
+    print(json.dumps({**model.metadata, "classes": {c: counts[c] for c in model.classes}}, ensure_ascii=False, indent=2))
+    sys.exit(0)
+
+model = LocalTextClassifier.load(args.modelo)
+records = list(VerdictLog.read(args.acervo))
+output = open(args.resultado, "w", encoding="utf-8") if args.resultado else None
+
+started = time.perf_counter()
+predictions = []
+for start in range(0, len(records), args.lote):
+    batch = records[start:start + args.lote]
+    predictions.extend(model.predict_batch([r.get("text", "") for r in batch]))
+elapsed = time.perf_counter() - started
+
+# Acerto por faixa de confiança: mostra se a confiança é calibrada e onde fixar os limites
+buckets = {}
+for record, prediction in zip(records, predictions):
+    if output:
+        output.write(json.dumps({**record, "prediction": prediction}, ensure_ascii=False) + "\n")
+    expected_label = verdict_label(record)
+    if expected_label:
+        bucket = min(9, int(prediction["confidence"] * 10)) / 10
+        hits, total = buckets.get(bucket, (0, 0))
+        buckets[bucket] = (hits + (prediction["label"] == expected_label), total + 1)
+if output:
+    output.close()
+
+print(f"Modelo {model.version}: {len(records)} documentos em {elapsed:.2f}s "
+      f"({elapsed / max(1, len(records)) * 1e6:.0f} µs/documento)")
+for bucket in sorted(buckets):
+    hits, total = buckets[bucket]
+    print(f"  confiança {bucket:.1f}-{bucket + 0.1:.1f}: {hits}/{total} corretos ({hits / total:.1%})")
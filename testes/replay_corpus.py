@@ -0,0 +1,120 @@
+"""
+Roda um corpus de documentos pelo pipeline completo (validate_document) gravando ou
+reproduzindo as chamadas de OCR/LLM, e compara latência, tokens e veredictos com uma execução anterior.
+
+Manifesto (JSON): [{"file": "corpus/rg_01.jpg", "expected_type": "RG"}, ...]
+
+Uso:
+    # 1x com Azure de verdade, gravando as respostas em .cassettes/
+    python testes/replay_corpus.py corpus.json --mode record --report base.json
+    # Depois, offline, quantas vezes quiser (ex: após mudar o pipeline)
+    python testes/replay_corpus.py corpus.json --mode replay --latency-scale 0 --report novo.json --baseline base.json
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description="Record/replay de um corpus pelo pipeline de validação.")
+parser.add_argument("manifest", help="JSON com a lista de {file, expected_type}")
+parser.add_argument("--mode", choices=["record", "replay"], default="replay")
+parser.add_argument("--cassettes", default=".cassettes")
+parser.add_argument("--latency-scale", type=float, default=1.0)
+parser.add_argument("--report", help="Salva o relatório desta execução neste arquivo JSON")
+parser.add_argument("--baseline", help="Relatório anterior para comparação")
+args = parser.parse_args()
+
+# As configurações são lidas na importação do app: define o transporte antes
+os.environ["TRANSPORT_MODE"] = args.mode
+os.environ["CASSETTE_DIR"] = args.cassettes
+os.environ["REPLAY_LATENCY_SCALE"] = str(args.latency_scale)
+# Veredictos reaproveitados/coalescidos esconderiam regressões: cada documento roda o pipeline inteiro
+os.environ["DUPLICATE_INDEX_ENABLED"] = "false"
+
+from app.core.exceptions import CassetteMissError
+from app.services.llm_service import DocumentAnalyzerService
+
+with open(args.manifest, "r", encoding="utf-8") as f:
+    corpus = json.load(f)
+
+service = DocumentAnalyzerService()
+manifest_dir = os.path.dirname(os.path.abspath(args.manifest))
+documents = []
+
+for item in corpus:
+    path = os.path.join(manifest_dir, item["file"])
+    with open(path, "rb") as f:
+        file_base64 = base64.b64encode(f.read()).decode("ascii")
+
+    tokens_before = service.llm_client.stats.as_dict()
+    started = time.perf_counter()
+    try:
+        result = service.validate_document(file_base64, item["expected_type"], os.path.basename(path))
+    except CassetteMissError as e:
+        # Sem gravação para algum OCR/LLM do documento: o replay não é comparável, precisa regravar
+        result = {"status": "cassette_miss", "message": str(e)}
+    latency = time.perf_counter() - started
+    tokens_after = service.llm_client.stats.as_dict()
+
+    documents.append({
+        "file": item["file"],
+        "expected_type": item["expected_type"],
+        "status": result["status"],
+        "detected_type": result.get("data", {}).get("detected_type"),
+        "message": result.get("message"),
+        "latency_seconds": round(latency, 4),
+        "prompt_tokens": tokens_after["prompt_tokens"] - tokens_before["prompt_tokens"],
+        "completion_tokens": tokens_after["completion_tokens"] - tokens_before["completion_tokens"],
+    })
+    print(f"{result['status']:>7} | {latency:6.2f}s | {item['expected_type']} -> {documents[-1]['detected_type']} | {item['file']}")
+
+
+def summarize(docs: list) -> dict:
+    latencies = sorted(d["latency_seconds"] for d in docs) or [0.0]
+    return {
+        "documents": len(docs),
+        "latency_p50": round(statistics.median(latencies), 4),
+        "latency_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4),
+        "prompt_tokens": sum(d["prompt_tokens"] for d in docs),
+        "completion_tokens": sum(d["completion_tokens"] for d in docs),
+        "success": sum(1 for d in docs if d["status"] == "success"),
+    }
+
+
+report = {"mode": args.mode, "summary": summarize(documents), "documents": documents}
+print("\nResumo:", json.dumps(report["summary"], ensure_ascii=False))
+
+if args.report:
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+misses = [d["file"] for d in documents if d["status"] == "cassette_miss"]
+if misses:
+    print(f"\n❌ {len(misses)} documento(s) sem gravação (rode com --mode record): {', '.join(misses)}")
+
+if args.baseline:
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    print("\nComparação com a linha de base:")
+    for metric, value in report["summary"].items():
+        before = baseline["summary"].get(metric)
+        print(f"  {metric}: {before} -> {value}")
+
+    previous = {d["file"]: d for d in baseline["documents"]}
+    changed = [
+        d for d in documents
+        if d["file"] in previous
+        and (d["status"], d["detected_type"]) != (previous[d["file"]]["status"], previous[d["file"]]["detected_type"])
+    ]
+    for d in changed:
+        old = previous[d["file"]]
+        print(f"  ❌ Veredicto mudou: {d['file']}: {old['status']}/{old['detected_type']} -> {d['status']}/{d['detected_type']}")
+    sys.exit(1 if changed or misses else 0)
+
+sys.exit(1 if misses else 0)
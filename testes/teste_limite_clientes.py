@@ -0,0 +1,152 @@
+"""
+Confere os limites por cliente (TokenBucket/TenantLimiter) e a identificação do tenant, sem chamar o Azure.
+Baldes por cliente, subclientes consumindo o limite do cliente, prazo total de espera sob disputa,
+descarte dos ociosos e limites desligados quando não há chaves cadastradas.
+
+Uso (na raiz do projeto):
+    python testes/teste_limite_clientes.py
+"""
+import os
+import sys
+import time
+import threading
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# As configurações exigem as credenciais na importação; os limites não usam o Azure
+for name in ("AZURE_OPENAI_KEY", "AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_DEPLOYMENT", "AZURE_OPENAI_API_VERSION", "AZURE_CV_KEY", "AZURE_CV_ENDPOINT"):
+    os.environ.setdefault(name, "offline")
+
+from app.core.config import settings
+from app.core.rate_limit import TokenBucket, TenantLimiter
+from app.core.exceptions import TenantRateLimitError
+
+
+def tenta(chamada) -> bool:
+    """True se passou, False se recebeu 429."""
+    try:
+        chamada()
+        return True
+    except TenantRateLimitError:
+        return False
+
+
+def cenario_balde():
+    bucket = TokenBucket(60)  # 1 por segundo
+    bucket.consume(60)
+    espera = bucket.wait_time(1)
+    # Pedido maior que a capacidade só exige o balde cheio (não espera para sempre)
+    bucket_cheio = TokenBucket(10)
+    return 0.9 < espera <= 1.0 and bucket_cheio.wait_time(50) == 0.0, f"espera por 1 token: {espera:.2f}s"
+
+
+def cenario_clientes_separados():
+    limiter = TenantLimiter(max_wait_seconds=0)
+    settings.TENANT_DEFAULT_REQUESTS_PER_MINUTE = 3
+    passaram_a = sum(tenta(lambda: limiter.acquire_request("cliente_a")) for _ in range(5))
+    passaram_b = sum(tenta(lambda: limiter.acquire_request("cliente_b")) for _ in range(2))
+    return passaram_a == 3 and passaram_b == 2, f"A: {passaram_a}/5, B: {passaram_b}/2"
+
+
+def cenario_subclientes():
+    limiter = TenantLimiter(max_wait_seconds=0)
+    settings.TENANT_DEFAULT_REQUESTS_PER_MINUTE = 3
+    # Trocar de subcliente a cada requisição não contorna o limite do cliente
+    passaram = sum(tenta(lambda i=i: limiter.acquire_request(f"cliente_a/sub{i}")) for i in range(6))
+    # 429 no subcliente devolve o que já tinha sido consumido do cliente
+    limiter = TenantLimiter(max_wait_seconds=0)
+    settings.TENANT_LIMITS = {"cliente_b/loja": {"requests_per_minute": 1}}
+    sub_passaram = sum(tenta(lambda: limiter.acquire_request("cliente_b/loja")) for _ in range(2))
+    settings.TENANT_LIMITS = {}
+    cliente = limiter._buckets["cliente_b"]["requests"].tokens
+    return passaram == 3 and sub_passaram == 1 and cliente >= 1.99, \
+        f"{passaram}/6 passaram trocando de sub; sub limitado: {sub_passaram}/2, saldo do cliente: {cliente:.2f}"
+
+
+def cenario_conciliacao():
+    limiter = TenantLimiter(max_wait_seconds=0)
+    settings.TENANT_DEFAULT_TOKENS_PER_MINUTE = 10000
+    limiter.reserve_tokens("cliente_a/sub", 4000)
+    limiter.reconcile("cliente_a/sub", 4000, {"prompt_tokens": 900, "completion_tokens": 100, "total_tokens": 1000})
+    saldos = [round(limiter._buckets[t]["tokens"].tokens) for t in ("cliente_a", "cliente_a/sub")]
+    return all(9000 <= s <= 9001 for s in saldos), f"saldos após usar 1000 de 4000 estimados: {saldos}"
+
+
+def cenario_prazo_total():
+    settings.TENANT_DEFAULT_REQUESTS_PER_MINUTE = 600  # 10 por segundo
+    limiter = TenantLimiter(max_wait_seconds=0.5)
+    for _ in range(600):
+        limiter.acquire_request("cliente_a")
+    # 20 threads disputam 10 fichas/s: a cada volta outra leva o saldo; ninguém pode passar do prazo
+    duracoes = []
+    lock = threading.Lock()
+
+    def disputar():
+        inicio = time.monotonic()
+        tenta(lambda: limiter.acquire_request("cliente_a"))
+        with lock:
+            duracoes.append(time.monotonic() - inicio)
+
+    threads = [threading.Thread(target=disputar) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # Folga para o último sleep (no máximo um intervalo de reposição) e o agendamento das threads
+    maior = max(duracoes)
+    return maior <= 0.5 + 0.15, f"maior espera: {maior:.2f}s (prazo 0.5s)"
+
+
+def cenario_descarte():
+    limiter = TenantLimiter(max_wait_seconds=0, max_tenants=10)
+    for i in range(50):
+        limiter.acquire_request(f"cliente_{i}")
+    return len(limiter._buckets) == 10 and len(limiter.metrics()) == 10, f"{len(limiter._buckets)} baldes em memória"
+
+
+def cenario_desligado():
+    limiter = TenantLimiter(max_wait_seconds=0, enabled=False)
+    settings.TENANT_DEFAULT_REQUESTS_PER_MINUTE = 1
+    passaram = sum(tenta(lambda: limiter.acquire_request("anonimo")) for _ in range(20))
+    limiter.reserve_tokens("anonimo", 10**9)
+    limiter.reconcile("anonimo", 10**9, None)
+    return passaram == 20 and not limiter.metrics(), f"{passaram}/20 passaram sem chaves cadastradas"
+
+
+def cenario_identificacao():
+    from function_app import _identify_tenant
+    settings.TENANT_API_KEYS = {"chave-parceiro": "parceiro"}
+
+    def req(headers):
+        return SimpleNamespace(headers=headers)
+
+    casos = [
+        (req({}), "anonimo"),
+        (req({"x-api-key": "inventada"}), "anonimo"),
+        (req({"X-Tenant-Id": "qualquer"}), "anonimo"),
+        (req({"x-api-key": "chave-parceiro"}), "parceiro"),
+        (req({"x-api-key": "chave-parceiro", "X-Tenant-Id": "loja 1/../x"}), "parceiro/loja1..x"),
+    ]
+    obtidos = [_identify_tenant(r) for r, _ in casos]
+    return obtidos == [esperado for _, esperado in casos], f"{obtidos}"
+
+
+CENARIOS = [
+    ("token bucket (reposição e pedido acima da capacidade)", cenario_balde),
+    ("clientes com baldes separados", cenario_clientes_separados),
+    ("subclientes consomem o limite do cliente", cenario_subclientes),
+    ("conciliação com o usage real", cenario_conciliacao),
+    ("prazo total de espera sob disputa", cenario_prazo_total),
+    ("descarte de clientes ociosos", cenario_descarte),
+    ("limites desligados sem chaves cadastradas", cenario_desligado),
+    ("identificação do tenant", cenario_identificacao),
+]
+
+falhas = 0
+for nome, cenario in CENARIOS:
+    ok, detalhe = cenario()
+    falhas += 0 if ok else 1
+    print(f"{'✅' if ok else '❌'} {nome}: {detalhe}")
+
+sys.exit(1 if falhas else 0)
@@ -0,0 +1,147 @@
+"""
+Mede o pico de memória de validate_document por cenário, sem chamar o Azure.
+OCR e LLM são substituídos por respostas fixas; o resto do pipeline roda de verdade.
+
+Dois medidores: tracemalloc (alocações do Python) e o RSS do processo, amostrado em paralelo
+(/proc/self/statm, Linux). tracemalloc NÃO enxerga buffers em C (pixels do Pillow), por isso o
+limite de cada cenário é conferido no RSS. Memória liberada por um cenário pode ser reaproveitada
+pelo seguinte sem aumentar o RSS: para um número exato, rode o cenário isolado.
+
+Uso (na raiz do projeto, com as variáveis do local.settings.json exportadas):
+    python testes/teste_memoria.py
+"""
+import io
+import os
+import sys
+import json
+import base64
+import time
+import zipfile
+import threading
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from app.core.memory import track_peak_memory
+from app.services.llm_service import DocumentAnalyzerService
+
+MB = 1024 * 1024
+PAGINA = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss_atual() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGINA
+
+
+class PicoRSS:
+    """Amostra o RSS a cada 2 ms enquanto o bloco roda; pico_mb = maior aumento sobre o início."""
+
+    def __enter__(self):
+        self.inicio = self.pico = rss_atual()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+        self._thread.start()
+        return self
+
+    def _amostrar(self):
+        while not self._parar.is_set():
+            self.pico = max(self.pico, rss_atual())
+            time.sleep(0.002)
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
+        self.pico = max(self.pico, rss_atual())
+        self.pico_mb = round((self.pico - self.inicio) / MB, 1)
+
+
+class OCRFixo:
+    def analyze(self, **kwargs):
+        line = SimpleNamespace(text="REGISTRO GERAL CEDULA DE IDENTIDADE REPUBLICA FEDERATIVA DO BRASIL NOME FILIACAO NATURALIDADE DATA DE NASCIMENTO")
+        return SimpleNamespace(read=SimpleNamespace(blocks=[SimpleNamespace(lines=[line])]))
+
+
+class LLMFixo:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        content = json.dumps({"detected_type": "RG", "is_match": True, "confidence": "high", "reasoning": "Teste."})
+        message = SimpleNamespace(content=content)
+        usage = SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def foto_jpeg(width: int, height: int) -> bytes:
+    # Ruído tem nitidez suficiente para passar na pré-checagem de qualidade
+    pixels = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def foto_celular(width: int, height: int) -> bytes:
+    # Foto de celular moderno (48 MP) de um documento: arquivo de ~2 MB, mas 190 MB se decodificada inteira
+    img = Image.new("RGB", (width, height), (235, 232, 225))
+    draw = ImageDraw.Draw(img)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", width // 90)
+    except OSError:
+        font = ImageFont.load_default()
+    for y in range(height // 15, height - height // 15, height // 28):
+        draw.text((width // 16, y), "REGISTRO GERAL  CEDULA DE IDENTIDADE  123.456.789-00", fill=(20, 20, 20), font=font)
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def png_gigante(width: int, height: int) -> bytes:
+    # Fundo liso comprime para poucos KB, mas decodificado ocupa width x height x 3 bytes
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def pdf_com_imagens(paginas: int) -> bytes:
+    imagens = [Image.open(io.BytesIO(foto_jpeg(1600, 1200))) for _ in range(paginas)]
+    buffer = io.BytesIO()
+    imagens[0].save(buffer, format="PDF", save_all=True, append_images=imagens[1:])
+    return buffer.getvalue()
+
+
+def docx_grande(paragrafos: int) -> bytes:
+    corpo = "".join(f"<w:p><w:r><w:t>Linha {i} Liquido a Receber R$ 1.234,56</w:t></w:r></w:p>" for i in range(paragrafos))
+    xml = f'<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>{corpo}</w:body></w:document>'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("word/document.xml", xml)
+    return buffer.getvalue()
+
+
+# (nome, arquivo, extensão, pico máximo aceito em MB no RSS)
+CENARIOS = [
+    ("JPEG 12MP", lambda: foto_jpeg(4000, 3000), "jpg", 80),
+    ("JPEG 48MP de celular (decodificado reduzido)", lambda: foto_celular(8064, 6048), "jpg", 100),
+    ("PNG 10000x8000 (rejeitado pelo orçamento)", lambda: png_gigante(10000, 8000), "png", 20),
+    ("PDF 5 páginas escaneadas", lambda: pdf_com_imagens(5), "pdf", 80),
+    ("DOCX 200 mil parágrafos", lambda: docx_grande(200_000), "docx", 40),
+]
+
+service = DocumentAnalyzerService()
+service.ocr_client = OCRFixo()
+service.llm_client = LLMFixo()
+
+falhas = 0
+for nome, gerar, extensao, limite_mb in CENARIOS:
+    arquivo_b64 = base64.b64encode(gerar()).decode("ascii")
+    with PicoRSS() as rss, track_peak_memory() as uso:
+        resultado = service.validate_document(arquivo_b64, "RG", f"teste.{extensao}")
+    ok = rss.pico_mb <= limite_mb
+    falhas += 0 if ok else 1
+    print(f"{'✅' if ok else '❌'} {nome}: {len(arquivo_b64) / MB:.1f} MB Base64 | RSS +{rss.pico_mb} MB "
+          f"(limite {limite_mb} MB) | tracemalloc {uso['peak_mb']} MB | {resultado['status']}: {resultado['message']}")
+
+sys.exit(1 if falhas else 0)
@@ -0,0 +1,81 @@
+"""
+Confere a pré-checagem local de qualidade (ImageQualityChecker) em imagens sintéticas, sem chamar o Azure.
+Scans/prints limpos (fundo branco, tamanhos A4) e prints de app em modo escuro precisam passar;
+fotos lavadas, borradas e escuras (sem contraste) não.
+
+Uso (na raiz do projeto, com as variáveis do local.settings.json exportadas):
+    python testes/teste_qualidade_imagem.py
+"""
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont
+from app.services.image_quality import ImageQualityChecker
+
+
+def extrato_renderizado(width: int, height: int) -> Image.Image:
+    """Extrato digital em fundo branco, como um print ou PDF renderizado."""
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    size = width // 75
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        font = ImageFont.load_default()
+    y = int(height * 0.05)
+    draw.text((width * 0.06, y), "BANCO EXEMPLO S.A. - EXTRATO DE CONTA CORRENTE", fill="black", font=font)
+    y += size * 3
+    while y < height * 0.6:
+        draw.text((width * 0.06, y), "12/03/2024  PIX RECEBIDO JOAO DA SILVA        1.234,56 C", fill=(30, 30, 30), font=font)
+        y += int(size * 1.6)
+    return img
+
+
+def app_modo_escuro(width: int, height: int) -> Image.Image:
+    """Print de app de banco em modo escuro: texto claro sobre fundo #121212."""
+    img = Image.new("RGB", (width, height), (18, 18, 18))
+    draw = ImageDraw.Draw(img)
+    size = width // 30
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        font = ImageFont.load_default()
+    y = int(height * 0.08)
+    draw.text((width * 0.06, y), "Extrato - Conta Corrente", fill=(240, 240, 240), font=font)
+    y += size * 3
+    while y < height * 0.9:
+        draw.text((width * 0.06, y), "12/03  Pix recebido   R$ 1.234,56", fill=(225, 225, 225), font=font)
+        draw.text((width * 0.06, y + int(size * 1.2)), "Saldo do dia         R$ 8.765,43", fill=(150, 150, 150), font=font)
+        y += int(size * 3.2)
+    return img
+
+
+def para_bytes(img: Image.Image, formato: str) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format=formato)
+    return buffer.getvalue()
+
+
+checker = ImageQualityChecker()
+extrato = extrato_renderizado(1240, 1754)
+cenarios = [
+    ("A4 150dpi PNG limpo", para_bytes(extrato, "PNG"), None),
+    ("A4 300dpi PNG limpo", para_bytes(extrato_renderizado(2480, 3508), "PNG"), None),
+    ("A4 JPEG limpo", para_bytes(extrato, "JPEG"), None),
+    ("print de app em modo escuro", para_bytes(app_modo_escuro(1080, 2340), "PNG"), None),
+    ("foto lavada (tinta clara)", para_bytes(ImageEnhance.Contrast(extrato).enhance(0.35), "JPEG"), "Imagem superexposta."),
+    ("foto borrada", para_bytes(extrato.filter(ImageFilter.GaussianBlur(12)), "JPEG"), "Imagem borrada."),
+    ("foto escura", para_bytes(ImageEnhance.Brightness(extrato).enhance(0.15), "JPEG"), "Imagem escura."),
+]
+
+falhas = 0
+for nome, dados, erro_esperado in cenarios:
+    resultado = checker.check(dados, "Extrato Bancário")
+    ok = resultado["valid"] == (erro_esperado is None) and resultado.get("error") == erro_esperado
+    falhas += not ok
+    print(f"{'✅' if ok else '❌'} {nome}: valid={resultado['valid']} {resultado.get('error') or ''} {resultado['metrics']}")
+
+sys.exit(1 if falhas else 0)
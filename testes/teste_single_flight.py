@@ -0,0 +1,146 @@
+"""
+Confere o single-flight (RequestCoalescer) com threads reais, sem chamar o Azure.
+Requisições idênticas do mesmo cliente viram uma validação só; clientes diferentes nunca
+compartilham resultado nem erro (429 do líder), e Idempotency-Key vale só dentro do cliente.
+
+Uso (na raiz do projeto):
+    python testes/teste_single_flight.py
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# As configurações exigem as credenciais na importação; o coalescer não usa o Azure
+for name in ("AZURE_OPENAI_KEY", "AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_DEPLOYMENT", "AZURE_OPENAI_API_VERSION", "AZURE_CV_KEY", "AZURE_CV_ENDPOINT"):
+    os.environ.setdefault(name, "offline")
+
+from app.core.single_flight import RequestCoalescer
+from app.core.exceptions import IdempotencyConflictError, TenantRateLimitError
+
+CONTEUDO = "QkFTRTY0" * 200
+
+
+def em_paralelo(chamadas: list) -> list:
+    """Dispara as chamadas juntas (barreira) e devolve (resultado ou exceção, compartilhado) na ordem."""
+    barreira = threading.Barrier(len(chamadas))
+    saidas = [None] * len(chamadas)
+
+    def rodar(i, chamada):
+        barreira.wait()
+        try:
+            saidas[i] = chamada()
+        except Exception as e:
+            saidas[i] = (e, False)
+
+    threads = [threading.Thread(target=rodar, args=(i, c)) for i, c in enumerate(chamadas)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return saidas
+
+
+def validacao_lenta(contador: list, resultado: dict, segundos: float = 0.2):
+    def compute():
+        contador.append(1)
+        time.sleep(segundos)
+        return resultado
+    return compute
+
+
+def cenario_mesmo_cliente():
+    coalescer = RequestCoalescer(replay_seconds=60)
+    fingerprint = coalescer.fingerprint(CONTEUDO, "RG|", "jpg")
+    key = coalescer.build_key(fingerprint, None, "cliente_a")
+    execucoes = []
+    saidas = em_paralelo([lambda: coalescer.run(key, fingerprint, validacao_lenta(execucoes, {"status": "success"}))] * 5)
+    compartilhados = sum(1 for _, compartilhado in saidas if compartilhado)
+    return len(execucoes) == 1 and compartilhados == 4, f"{len(execucoes)} execução(ões), {compartilhados} compartilhadas"
+
+
+def cenario_clientes_diferentes():
+    coalescer = RequestCoalescer(replay_seconds=60)
+    fingerprint = coalescer.fingerprint(CONTEUDO, "RG|", "jpg")
+    execucoes = []
+    saidas = em_paralelo([
+        lambda: coalescer.run(coalescer.build_key(fingerprint, None, "cliente_a"), fingerprint, validacao_lenta(execucoes, {"tenant": "a"})),
+        lambda: coalescer.run(coalescer.build_key(fingerprint, None, "cliente_b"), fingerprint, validacao_lenta(execucoes, {"tenant": "b"})),
+    ])
+    ok = len(execucoes) == 2 and saidas[0] == ({"tenant": "a"}, False) and saidas[1] == ({"tenant": "b"}, False)
+    return ok, f"{len(execucoes)} execuções, resultados {saidas}"
+
+
+def cenario_429_do_lider():
+    coalescer = RequestCoalescer(replay_seconds=60)
+    fingerprint = coalescer.fingerprint(CONTEUDO, "RG|", "jpg")
+
+    def estourado():
+        time.sleep(0.2)
+        raise TenantRateLimitError("Limite de tokens excedido para este cliente.")
+
+    saidas = em_paralelo([
+        lambda: coalescer.run(coalescer.build_key(fingerprint, None, "cliente_a"), fingerprint, estourado),
+        lambda: coalescer.run(coalescer.build_key(fingerprint, None, "cliente_b"), fingerprint, lambda: {"status": "success"}),
+    ])
+    ok = isinstance(saidas[0][0], TenantRateLimitError) and saidas[1] == ({"status": "success"}, False)
+    # Falhas não ficam na janela de replay: a nova tentativa do cliente A recomputa
+    ok = ok and coalescer.run(coalescer.build_key(fingerprint, None, "cliente_a"), fingerprint, lambda: {"status": "success"}) == ({"status": "success"}, False)
+    return ok, f"A: {type(saidas[0][0]).__name__}, B: {saidas[1]}"
+
+
+def cenario_idempotency_key():
+    coalescer = RequestCoalescer(replay_seconds=60)
+    fp_a = coalescer.fingerprint(CONTEUDO, "RG|", "jpg")
+    fp_b = coalescer.fingerprint(CONTEUDO + "AAAA", "RG|", "jpg")
+    coalescer.run(coalescer.build_key(fp_a, "chave-1", "cliente_a"), fp_a, lambda: {"tenant": "a"})
+    # Mesma chave em outro cliente: sem conflito nem resultado alheio
+    resultado_b = coalescer.run(coalescer.build_key(fp_b, "chave-1", "cliente_b"), fp_b, lambda: {"tenant": "b"})
+    try:
+        coalescer.run(coalescer.build_key(fp_b, "chave-1", "cliente_a"), fp_b, lambda: {"tenant": "a"})
+        conflito = False
+    except IdempotencyConflictError:
+        conflito = True
+    return resultado_b == ({"tenant": "b"}, False) and conflito, f"B: {resultado_b}, conflito no mesmo cliente: {conflito}"
+
+
+def cenario_extensao_e_modo():
+    coalescer = RequestCoalescer(replay_seconds=60)
+    impressoes = {
+        coalescer.fingerprint(CONTEUDO, "RG|", "jpg"),
+        coalescer.fingerprint(CONTEUDO, "RG|", "pdf"),
+        coalescer.fingerprint(CONTEUDO, "RG|verbose", "jpg"),
+        coalescer.fingerprint(CONTEUDO.encode("ascii"), "RG|", "jpg"),
+    }
+    return len(impressoes) == 4, f"{len(impressoes)} impressões distintas de 4"
+
+
+def cenario_nao_cacheavel():
+    coalescer = RequestCoalescer(replay_seconds=60)
+    fingerprint = coalescer.fingerprint(CONTEUDO, "RG|", "jpg")
+    key = coalescer.build_key(fingerprint, None, "cliente_a")
+    erro = {"status": "error", "message": "Erro Interno: timeout"}
+    nao_cacheavel = lambda r: not str(r.get("message", "")).startswith("Erro Interno")
+    coalescer.run(key, fingerprint, lambda: erro, cacheable=nao_cacheavel)
+    segunda = coalescer.run(key, fingerprint, lambda: {"status": "success"}, cacheable=nao_cacheavel)
+    return segunda == ({"status": "success"}, False), f"segunda chamada: {segunda}"
+
+
+CENARIOS = [
+    ("mesmo cliente, 5 requisições idênticas", cenario_mesmo_cliente),
+    ("mesmo conteúdo, clientes diferentes", cenario_clientes_diferentes),
+    ("429 do líder não vaza para outro cliente", cenario_429_do_lider),
+    ("Idempotency-Key por cliente", cenario_idempotency_key),
+    ("extensão/modo/formato no fingerprint", cenario_extensao_e_modo),
+    ("erro interno fora da janela de replay", cenario_nao_cacheavel),
+]
+
+falhas = 0
+for nome, cenario in CENARIOS:
+    ok, detalhe = cenario()
+    falhas += 0 if ok else 1
+    print(f"{'✅' if ok else '❌'} {nome}: {detalhe}")
+
+sys.exit(1 if falhas else 0)